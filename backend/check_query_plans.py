@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Luna Hair Salon query plan check
+Creates the indexes declared in server.py and asserts via explain() that no hot
+API route falls back to a collection scan. Run against a local mongod:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=luna_plans python check_query_plans.py
+"""
+
+import asyncio
+import sys
+
+from server import HOT_QUERIES, client, db, ensure_indexes, find_collscans
+
+
+async def check_query_plans():
+    await ensure_indexes(db)
+    offenders = await find_collscans(db)
+
+    for route, collection, _, _ in HOT_QUERIES:
+        status = "❌ COLLSCAN" if route in offenders else "✅ IXSCAN"
+        print(f"{status} {route} ({collection})")
+
+    return not offenders
+
+
+if __name__ == "__main__":
+    try:
+        success = asyncio.run(check_query_plans())
+    finally:
+        client.close()
+    sys.exit(0 if success else 1)
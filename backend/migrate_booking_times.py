@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Luna Hair Salon booking time migration
+Backfills the UTC start_at/end_at window on bookings created before it was
+stored, in batches, so availability and admin date filters can use index range
+scans. Safe to re-run; only bookings without start_at are touched.
+
+    python migrate_booking_times.py --batch-size 500
+"""
+
+import argparse
+import asyncio
+import sys
+
+from pymongo import UpdateOne
+
+from server import appointment_window, booking_duration, client, db
+
+
+async def migrate_booking_times(batch_size, dry_run=False):
+    projection = {"date": 1, "time": 1, "service_duration": 1, "total_duration": 1}
+    migrated = 0
+    invalid = 0
+    last_id = None
+
+    while True:
+        query = {"start_at": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.bookings.find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        updates = []
+        for booking in batch:
+            try:
+                start_at, end_at = appointment_window(
+                    booking.get("date"), booking.get("time"), booking_duration(booking)
+                )
+            except (TypeError, ValueError):
+                # Left without start_at so it is reported again until fixed by hand
+                invalid += 1
+                print(f"⚠️  Skipping {booking['_id']}: unparseable date/time "
+                      f"{booking.get('date')!r} {booking.get('time')!r}")
+                continue
+            updates.append(UpdateOne(
+                {"_id": booking["_id"], "start_at": {"$exists": False}},
+                {"$set": {"start_at": start_at, "end_at": end_at}}
+            ))
+
+        if updates and not dry_run:
+            result = await db.bookings.bulk_write(updates, ordered=False)
+            migrated += result.modified_count
+        else:
+            migrated += len(updates)
+        print(f"Processed batch of {len(batch)} (migrated so far: {migrated})")
+
+    print(f"{'Would migrate' if dry_run else 'Migrated'} {migrated} bookings, {invalid} invalid")
+    return invalid == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        success = asyncio.run(migrate_booking_times(args.batch_size, args.dry_run))
+    finally:
+        client.close()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Luna Hair Salon notification worker
+Delivers booking confirmations, day-before reminders and waitlist offers from
+the outbox collection, for deployments where the API workers run with
+NOTIFICATION_DISPATCHER=worker (or without SMTP settings). API workers always
+write the outbox; any number of these workers can share it.
+
+    SMTP_HOST=smtp.example.com SMTP_PORT=587 SMTP_STARTTLS=1 python notification_worker.py
+"""
+
+import asyncio
+import sys
+
+from server import client, smtp_dispatcher
+
+
+async def main():
+    dispatcher = smtp_dispatcher()
+    if dispatcher is None:
+        print("SMTP_HOST is not set; nothing to deliver with")
+        return False
+    print(f"Delivering outbox notifications via {dispatcher.sender.host}:{dispatcher.sender.port}", flush=True)
+    dispatcher.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await dispatcher.stop()
+        client.close()
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(0 if asyncio.run(main()) else 1)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Luna Hair Salon client index rebuild
+Recreates the clients collection behind /api/clients from the bookings
+collection: one document per normalized email with booking counts and recent
+references. Run once after upgrading, or whenever the index needs repairing.
+
+    python rebuild_clients.py
+"""
+
+import asyncio
+
+from server import client, db, rebuild_clients
+
+
+async def main():
+    try:
+        count = await rebuild_clients(db)
+        print(f"Rebuilt {count} client documents")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Luna Hair Salon analytics reconcile
+Rebuilds the pre-aggregated daily_stats counters behind /api/stats from the
+bookings collection, repairing any drift in the live $inc updates. Meant to
+run nightly, e.g. from cron:
+
+    0 3 * * * cd /app/backend && python reconcile_stats.py
+"""
+
+import argparse
+import asyncio
+from datetime import date, timedelta
+
+from server import client, db, reconcile_daily_stats
+
+
+def parse_args():
+    today = date.today()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--date-from", default=(today - timedelta(days=7)).isoformat(),
+                        help="First appointment date to rebuild (default: a week ago)")
+    parser.add_argument("--date-to", default=(today + timedelta(days=90)).isoformat(),
+                        help="Last appointment date to rebuild (default: 90 days ahead)")
+    return parser.parse_args()
+
+
+async def main(args):
+    try:
+        rows = await reconcile_daily_stats(db, args.date_from, args.date_to)
+        print(f"Rebuilt {rows} daily_stats rows for {args.date_from} to {args.date_to}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
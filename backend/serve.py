@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Luna Hair Salon production launcher
+Runs server:app under uvicorn with WEB_CONCURRENCY worker processes, using
+uvloop and httptools when they are installed. Every worker opens its own Motor
+connection pool and warms it (plus the catalog and availability caches) during
+startup, so the port only receives traffic once a worker is ready.
+
+    WEB_CONCURRENCY=4 PORT=8001 python serve.py
+
+Worker and pool sizing: each worker holds up to MONGO_MAX_POOL_SIZE
+connections, so keep WEB_CONCURRENCY * MONGO_MAX_POOL_SIZE within what the
+MongoDB deployment allows.
+"""
+
+import importlib.util
+import os
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+BACKEND_DIR = Path(__file__).parent
+
+# Production defaults; anything already set in the environment wins
+PRODUCTION_ENV = {
+    "MONGO_MAX_POOL_SIZE": "50",
+    "MONGO_MIN_POOL_SIZE": "10",
+    "MONGO_MAX_IDLE_TIME_MS": "300000",
+    "MONGO_CONNECT_TIMEOUT_MS": "5000",
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": "5000",
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": "2000",
+}
+
+
+def installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    # Read .env first so its settings take precedence over the defaults below
+    load_dotenv(BACKEND_DIR / ".env")
+    for name, value in PRODUCTION_ENV.items():
+        os.environ.setdefault(name, value)
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    loop = "uvloop" if installed("uvloop") else "asyncio"
+    http = "httptools" if installed("httptools") else "h11"
+    print(
+        f"Starting {workers} workers (loop={loop}, http={http}, "
+        f"pool {os.environ['MONGO_MIN_POOL_SIZE']}-{os.environ['MONGO_MAX_POOL_SIZE']} per worker)"
+    )
+
+    uvicorn.run(
+        "server:app",
+        app_dir=str(BACKEND_DIR),
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8001")),
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=int(os.environ.get("BACKLOG", "2048")),
+        timeout_keep_alive=int(os.environ.get("KEEP_ALIVE_TIMEOUT", "5")),
+        limit_max_requests=int(os.environ["MAX_REQUESTS"]) if os.environ.get("MAX_REQUESTS") else None,
+        access_log=os.environ.get("ACCESS_LOG", "0") == "1",
+        log_level=os.environ.get("LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
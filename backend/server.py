@@ -1,25 +1,263 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from bson import ObjectId
+from bson.errors import InvalidId
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional
 import uuid
-from datetime import datetime
+import asyncio
+import base64
+import csv
+import hashlib
+import io
+import json
+import re
+import smtplib
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from time import monotonic, perf_counter
+from zoneinfo import ZoneInfo
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# ==================== Metrics ====================
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; buckets are allocated once per label set"""
+
+    __slots__ = ("counts", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += self.counts[-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Request and Mongo command metrics rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = {}  # (method, route, status) -> count
+        self.request_latency = {}  # (method, route) -> Histogram
+        self.command_latency = {}  # (collection, command) -> Histogram
+        self.command_failures = {}  # (collection, command) -> count
+        self._command_lock = threading.Lock()
+
+    def observe_request(self, method, route, status, seconds):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.request_latency.get((method, route))
+        if histogram is None:
+            histogram = self.request_latency[(method, route)] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_command(self, collection, command, seconds, failed=False):
+        # Called from the driver's threads
+        with self._command_lock:
+            histogram = self.command_latency.get((collection, command))
+            if histogram is None:
+                histogram = self.command_latency[(collection, command)] = Histogram()
+            histogram.observe(seconds)
+            if failed:
+                key = (collection, command)
+                self.command_failures[key] = self.command_failures.get(key, 0) + 1
+
+    def render(self):
+        lines = [
+            "# HELP luna_http_requests_in_flight Requests currently being served",
+            "# TYPE luna_http_requests_in_flight gauge",
+            f"luna_http_requests_in_flight {self.in_flight}",
+            "# HELP luna_http_requests_total Completed requests",
+            "# TYPE luna_http_requests_total counter",
+        ]
+        for (method, route, status), count in list(self.requests.items()):
+            lines.append(f'luna_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+        lines += [
+            "# HELP luna_http_request_duration_seconds Request latency",
+            "# TYPE luna_http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in list(self.request_latency.items()):
+            lines += histogram.render("luna_http_request_duration_seconds", f'method="{method}",route="{route}"')
+        with self._command_lock:
+            lines += [
+                "# HELP luna_mongo_command_duration_seconds MongoDB command round-trip time",
+                "# TYPE luna_mongo_command_duration_seconds histogram",
+            ]
+            for (collection, command), histogram in self.command_latency.items():
+                lines += histogram.render(
+                    "luna_mongo_command_duration_seconds", f'collection="{collection}",command="{command}"'
+                )
+            lines += [
+                "# HELP luna_mongo_command_failures_total Failed MongoDB commands",
+                "# TYPE luna_mongo_command_failures_total counter",
+            ]
+            for (collection, command), count in self.command_failures.items():
+                lines.append(
+                    f'luna_mongo_command_failures_total{{collection="{collection}",command="{command}"}} {count}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feeds per-collection command counts and durations into Metrics"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._collections = {}  # (connection, request_id) -> collection
+
+    def started(self, event):
+        # getMore carries the cursor id under its own name and the collection separately
+        key = "collection" if event.command_name == "getMore" else event.command_name
+        collection = event.command.get(key)
+        if isinstance(collection, str):
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+    def _finish(self, event, failed):
+        collection = self._collections.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            self.metrics.observe_command(collection, event.command_name, event.duration_micros / 1e6, failed)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per matched route template"""
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.in_flight += 1
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.in_flight -= 1
+            route = scope.get("route")
+            self.metrics.observe_request(
+                scope["method"], route.path if route else "unmatched", status, perf_counter() - started
+            )
+
+
+metrics = Metrics()
+
+# MongoDB connection; pool settings apply per worker process
+MONGO_POOL_SETTINGS = {
+    "MONGO_MAX_POOL_SIZE": "maxPoolSize",
+    "MONGO_MIN_POOL_SIZE": "minPoolSize",
+    "MONGO_MAX_IDLE_TIME_MS": "maxIdleTimeMS",
+    "MONGO_CONNECT_TIMEOUT_MS": "connectTimeoutMS",
+    "MONGO_SOCKET_TIMEOUT_MS": "socketTimeoutMS",
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": "serverSelectionTimeoutMS",
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": "waitQueueTimeoutMS",
+}
+
+
+def mongo_client_options():
+    """Motor client options for the MONGO_* pool settings present in the environment"""
+    return {option: int(os.environ[name]) for name, option in MONGO_POOL_SETTINGS.items() if os.environ.get(name)}
+
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(metrics)], **mongo_client_options())
 db = client[os.environ['DB_NAME']]
 
+# ==================== JSON ====================
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# orjson encodes datetimes natively and ObjectIds through _json_default, so
+# documents can be returned straight from Mongo without per-field conversion
+FAST_JSON = orjson is not None and os.environ.get('FAST_JSON', '1') != '0'
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def prepare_documents(documents):
+    """Make Mongo documents JSON-safe for the stdlib encoder (unneeded with FAST_JSON)"""
+    for doc in documents:
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+        if "created_at" in doc and isinstance(doc["created_at"], datetime):
+            doc["created_at"] = doc["created_at"].isoformat()
+    return documents
+
+
+def json_response(content, status_code=200):
+    """Serialize raw Mongo documents with orjson, or fall back to FastAPI's encoder.
+
+    A returned Response overrides the route's status code, so routes that
+    answer 201 pass it in.
+    """
+    if FAST_JSON:
+        return FastJSONResponse(content, status_code=status_code)
+    return content
+
+
 # Create the main app without a prefix
-app = FastAPI(title="Luna Hair Salon API")
+app = FastAPI(
+    title="Luna Hair Salon API",
+    default_response_class=FastJSONResponse if FAST_JSON else JSONResponse
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -45,8 +283,9 @@ class ClientInfo(BaseModel):
 class ServiceItem(BaseModel):
     category: str
     name: str
-    price: str
-    duration: int
+    # Informational only; prices and durations come from the catalog
+    price: Optional[str] = None
+    duration: Optional[int] = None
 
 
 class BookingCreate(BaseModel):
@@ -55,7 +294,7 @@ class BookingCreate(BaseModel):
     service_name: Optional[str] = None
     service_price: Optional[str] = None
     service_duration: Optional[int] = None
-    # New: multiple services
+    # New: multiple services; the totals are recomputed from the catalog
     services: Optional[List[ServiceItem]] = None
     total_duration: Optional[int] = None
     total_price_min: Optional[str] = None
@@ -87,9 +326,58 @@ class Booking(BaseModel):
     client_email: str
     client_phone: str
     client_notes: str
+    # UTC appointment window derived from date, time and duration
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
+    # Shared by every occurrence of a recurring booking
+    series_id: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class BookingReschedule(BaseModel):
+    date: str
+    time: str
+    stylist_id: Optional[int] = None
+
+
+class BookingSeriesCreate(BaseModel):
+    service_category: Optional[str] = None
+    service_name: Optional[str] = None
+    service_price: Optional[str] = None
+    service_duration: Optional[int] = None
+    services: Optional[List[ServiceItem]] = None
+    total_duration: Optional[int] = None
+    total_price_min: Optional[str] = None
+    # First occurrence, then one every `interval_weeks`
+    start_date: str
+    interval_weeks: int = Field(ge=1, le=52)
+    count: int = Field(ge=2, le=26)
+    time: str
+    stylist_id: int
+    stylist_name: str
+    client: ClientInfo
+
+
+class BookingSeriesReschedule(BaseModel):
+    # Applied to every active occurrence on or after `from_date`
+    time: Optional[str] = None
+    stylist_id: Optional[int] = None
+    shift_days: int = 0
+    from_date: Optional[str] = None
+
+
+class WaitlistCreate(BaseModel):
+    service_category: Optional[str] = None
+    service_name: Optional[str] = None
+    services: Optional[List[ServiceItem]] = None
+    date: str
+    # Acceptable start times, inclusive
+    earliest_time: str
+    latest_time: str
+    stylist_id: int
+    client: ClientInfo
+
+
 class ContactCreate(BaseModel):
     first_name: str
     last_name: str
@@ -109,7 +397,7 @@ class Contact(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
-class ServiceItem(BaseModel):
+class CatalogItem(BaseModel):
     name: str
     price: str
     duration: int
@@ -120,7 +408,7 @@ class Service(BaseModel):
     category: str
     icon: str
     description: str
-    items: List[ServiceItem]
+    items: List[CatalogItem]
 
 
 class Stylist(BaseModel):
@@ -195,10 +483,15 @@ SERVICES = [
     }
 ]
 
+# `categories`: the service categories a stylist specialises in, used to
+# assign "Any Available" bookings
 STYLISTS = [
-    {"id": 1, "name": "Sofia Martinez", "specialty": "Color Specialist"},
-    {"id": 2, "name": "Emma Chen", "specialty": "Cut & Style Expert"},
-    {"id": 3, "name": "Olivia Brown", "specialty": "Bridal & Updos"},
+    {"id": 1, "name": "Sofia Martinez", "specialty": "Color Specialist",
+     "categories": ["Color Services", "Hair Treatments"]},
+    {"id": 2, "name": "Emma Chen", "specialty": "Cut & Style Expert",
+     "categories": ["Haircuts & Styling"]},
+    {"id": 3, "name": "Olivia Brown", "specialty": "Bridal & Updos",
+     "categories": ["Haircuts & Styling", "Beauty & Add-Ons"]},
     {"id": 4, "name": "Any Available", "specialty": "All Services"}
 ]
 
@@ -209,230 +502,3074 @@ TIME_SLOTS = [
     "6:00 PM", "6:30 PM", "7:00 PM"
 ]
 
+SLOT_MINUTES = 30
+ANY_STYLIST_ID = 4
+SALON_TIMEZONE = ZoneInfo(os.environ.get('SALON_TIMEZONE', 'America/Toronto'))
+# Only confirmed bookings occupy time; cancelled and completed ones free their slots
+ACTIVE_STATUS = "confirmed"
+
 
 # ==================== Helper Functions ====================
 
-def generate_reference():
+REFERENCE_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+REFERENCE_LENGTH = 6
+REFERENCE_SPACE = len(REFERENCE_ALPHABET) ** REFERENCE_LENGTH
+# 36**6 = 2**12 * 3**12, so any multiplier that is odd and not divisible by 3
+# makes the mapping below a bijection: distinct sequence numbers never share a
+# reference, while consecutive bookings still get unrelated-looking codes.
+REFERENCE_MULTIPLIER = 1_500_000_001
+REFERENCE_OFFSET = 918_273_645
+
+
+def encode_reference(sequence):
+    """Map a sequence number in [0, 36**6) to a reference like LUNA-ABC123"""
+    value = (sequence * REFERENCE_MULTIPLIER + REFERENCE_OFFSET) % REFERENCE_SPACE
+    chars = []
+    for _ in range(REFERENCE_LENGTH):
+        value, remainder = divmod(value, len(REFERENCE_ALPHABET))
+        chars.append(REFERENCE_ALPHABET[remainder])
+    return f"LUNA-{''.join(reversed(chars))}"
+
+
+class ReferenceAllocator:
+    """Hands out booking references from a Mongo-backed sequence.
+
+    Each worker reserves `block_size` sequence numbers at a time with one
+    atomic $inc, so most references are allocated in memory and no two
+    workers can ever receive the same number.
+    """
+
+    def __init__(self, collection, name="booking_reference", block_size=100):
+        self.collection = collection
+        self.name = name
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def next(self):
+        async with self._lock:
+            if self._next >= self._end:
+                await self._reserve()
+            sequence = self._next
+            self._next += 1
+        return encode_reference(sequence)
+
+    async def _reserve(self):
+        counter = await self.collection.find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"value": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = counter["value"]
+        self._next = self._end - self.block_size
+
+
+reference_allocator = ReferenceAllocator(
+    db.counters,
+    block_size=int(os.environ.get('REFERENCE_BLOCK_SIZE', '100'))
+)
+
+
+async def generate_reference():
     """Generate a unique booking reference like LUNA-ABC123"""
-    import time
-    timestamp = int(time.time() * 1000)
-    base36 = ""
-    while timestamp:
-        timestamp, remainder = divmod(timestamp, 36)
-        base36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"[remainder] + base36
-    return f"LUNA-{base36[-6:]}"
+    return await reference_allocator.next()
 
 
-# ==================== Routes ====================
+def appointment_start(date, time):
+    """UTC start of an appointment from its salon-local date and time slot label"""
+    local = datetime.strptime(f"{date} {time}", "%Y-%m-%d %I:%M %p").replace(tzinfo=SALON_TIMEZONE)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
 
-@api_router.get("/")
-async def root():
-    return {"message": "Luna Hair Salon API", "status": "running"}
 
+def appointment_window(date, time, duration):
+    """UTC (start_at, end_at) of an appointment"""
+    start_at = appointment_start(date, time)
+    return start_at, start_at + timedelta(minutes=duration or SLOT_MINUTES)
 
-# --- Services Routes ---
 
-@api_router.get("/services", response_model=dict)
-async def get_services():
-    """Get all services with categories"""
-    return {"services": SERVICES}
+def salon_day_bounds(first, last=None):
+    """UTC [start, end) covering salon-local dates `first` through `last`"""
+    start = datetime.strptime(first, "%Y-%m-%d").replace(tzinfo=SALON_TIMEZONE)
+    end = datetime.strptime(last or first, "%Y-%m-%d").replace(tzinfo=SALON_TIMEZONE) + timedelta(days=1)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None)
+    )
 
 
-# --- Stylists Routes ---
+def date_runs(dates):
+    """[first, last] of each run of consecutive YYYY-MM-DD dates"""
+    runs = []
+    previous = None
+    for date in sorted(set(dates)):
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+        if previous is not None and day - previous == timedelta(days=1):
+            runs[-1][1] = date
+        else:
+            runs.append([date, date])
+        previous = day
+    return runs
 
-@api_router.get("/stylists", response_model=dict)
-async def get_stylists():
-    """Get available stylists"""
-    return {"stylists": STYLISTS}
 
+def occupancy_query(stylist_ids, dates):
+    """Filter for the active bookings on `dates`, of `stylist_ids` (None for all).
 
-# --- Time Slots Routes ---
+    One start_at range per run of consecutive dates, so sparse dates (a
+    recurring series) do not read everything in between; bookings not yet
+    migrated by migrate_booking_times.py are still found by their date string.
+    """
+    branches = []
+    for first, last in date_runs(dates):
+        start, end = salon_day_bounds(first, last)
+        branches.append({"status": ACTIVE_STATUS, "start_at": {"$gte": start, "$lt": end}})
+    branches.append({"status": ACTIVE_STATUS, "date": {"$in": list(dates)}, "start_at": {"$exists": False}})
+    if stylist_ids is not None:
+        for branch in branches:
+            branch["stylist_id"] = {"$in": list(stylist_ids)}
+    return {"$or": branches}
 
-@api_router.get("/timeslots")
-async def get_time_slots(date: str, stylist_id: Optional[int] = None):
-    """Get available time slots for a specific date"""
-    # In a real implementation, we would check existing bookings
-    # For now, return all slots as available
-    
-    # Check existing bookings for this date and stylist
-    query = {"date": date}
-    if stylist_id and stylist_id != 4:  # 4 is "Any Available"
-        query["stylist_id"] = stylist_id
-    
-    booked_times = []
-    async for booking in db.bookings.find(query, {"time": 1}):
-        booked_times.append(booking["time"])
-    
-    available_slots = [slot for slot in TIME_SLOTS if slot not in booked_times]
-    
+
+def slots_needed(duration):
+    """Number of consecutive time slots a service of `duration` minutes occupies"""
+    if not duration or duration <= 0:
+        return 1
+    return -(-duration // SLOT_MINUTES)
+
+
+def booking_duration(booking):
+    """Total service minutes of a stored booking (single or multiple services)"""
+    return booking.get("total_duration") or booking.get("service_duration") or SLOT_MINUTES
+
+
+PRICE_AMOUNT = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def min_price(price):
+    """Lowest amount in a catalog price string, e.g. "$50+" -> 50.0 (0 when there is none)"""
+    match = PRICE_AMOUNT.search(price or "")
+    return float(match.group().replace(",", "")) if match else 0.0
+
+
+def price_label(amount):
+    """Display form of a minimum total price, e.g. 125.0 -> $125+"""
+    return f"${amount:,.2f}".replace(".00", "") + "+"
+
+
+def service_summary(entry):
+    """Comma-separated service names of a booking or waitlist entry"""
+    if entry.get("services"):
+        return ", ".join(service["name"] for service in entry["services"])
+    return entry.get("service_name")
+
+
+def booking_lines(booking):
+    """(service name, minutes, minimum price) for each service in a stored booking"""
+    if booking.get("services"):
+        return [
+            (service["name"], service.get("duration") or 0, min_price(service.get("price")))
+            for service in booking["services"]
+        ]
+    return [(
+        booking.get("service_name"),
+        booking.get("service_duration") or 0,
+        min_price(booking.get("service_price"))
+    )]
+
+
+def slot_mask(time, duration):
+    """Bitmask of the catalog time slots covered by a booking starting at `time`"""
+    time_slots = catalog.snapshot.time_slots
+    start = catalog.snapshot.slot_index.get(time)
+    if start is None:
+        return 0
+    span = min(slots_needed(duration), len(time_slots) - start)
+    return ((1 << span) - 1) << start
+
+
+def free_start_mask(occupied, duration):
+    """Bitmask of start slots whose whole service span fits before closing and is unoccupied"""
+    span = slots_needed(duration)
+    need = (1 << span) - 1
+    starts = 0
+    for i in range(len(catalog.snapshot.time_slots) - span + 1):
+        if not occupied & (need << i):
+            starts |= 1 << i
+    return starts
+
+
+def slots_from_mask(mask):
+    """Time slot labels for the set bits of `mask`"""
+    return [slot for i, slot in enumerate(catalog.snapshot.time_slots) if mask >> i & 1]
+
+
+# ==================== Catalog Cache ====================
+
+class CachedJSON:
+    """A JSON payload serialized once, served with a content-hash ETag"""
+
+    def __init__(self, payload, max_age=300):
+        self.body = json.dumps(payload, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.headers = {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={max_age}",
+        }
+
+    def matches(self, if_none_match):
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+    def response(self, request):
+        """304 if the client already holds this version, otherwise the cached body"""
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=self.headers)
+        return Response(content=self.body, media_type="application/json", headers=self.headers)
+
+
+CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE', '300'))
+
+
+# ==================== Catalog ====================
+
+class CatalogSnapshot:
+    """One immutable version of the services, stylists and opening hours"""
+
+    def __init__(self, version, services, stylists, time_slots):
+        self.version = version
+        self.services = services
+        self.stylists = stylists
+        self.time_slots = time_slots
+        self.slot_index = {slot: i for i, slot in enumerate(time_slots)}
+        self.service_index = {
+            (category["category"], item["name"]): {"category": category["category"], **item}
+            for category in services
+            for item in category["items"]
+        }
+        # Price strings ("$50+", "Consultation") parsed once per catalog version
+        self.min_prices = {key: min_price(item["price"]) for key, item in self.service_index.items()}
+        self.stylist_index = {stylist["id"]: stylist for stylist in stylists}
+        self.stylist_categories = {stylist["id"]: set(stylist.get("categories", ())) for stylist in stylists}
+        self.real_stylists = [stylist for stylist in stylists if stylist["id"] != ANY_STYLIST_ID]
+        self.services_response = CachedJSON({"services": services}, max_age=CATALOG_MAX_AGE)
+        self.stylists_response = CachedJSON({"stylists": stylists}, max_age=CATALOG_MAX_AGE)
+
+    def resolve_service(self, category, name):
+        service = self.service_index.get((category, name))
+        if service is None:
+            raise HTTPException(status_code=400, detail=f"Unknown service: {category} / {name}")
+        return service
+
+    def quote(self, items):
+        """Catalog entries, total minutes and minimum total price of a multi-service selection"""
+        services = []
+        minutes = 0
+        price = 0.0
+        for item in items:
+            service = self.resolve_service(item.category, item.name)
+            services.append(dict(service))
+            minutes += service["duration"]
+            price += self.min_prices[item.category, item.name]
+        return services, minutes, price
+
+    def resolve_stylist(self, stylist_id):
+        stylist = self.stylist_index.get(stylist_id)
+        if stylist is None:
+            raise HTTPException(status_code=400, detail=f"Unknown stylist: {stylist_id}")
+        return stylist
+
+
+class Catalog:
+    """Mongo-backed catalog held as a versioned in-memory snapshot.
+
+    The catalog lives in the `services` and `stylists` collections plus a
+    `catalog_meta` document carrying the opening hours and a version number.
+    Whoever edits the catalog bumps the version (see bump_version()); every
+    worker polls that single field and swaps in a fresh snapshot when it moves.
+    Until the first load the built-in SERVICES/STYLISTS/TIME_SLOTS are served.
+    """
+
+    META_ID = "catalog"
+
+    def __init__(self, database, poll_interval=30.0):
+        self.database = database
+        self.poll_interval = poll_interval
+        self.snapshot = CatalogSnapshot(0, SERVICES, STYLISTS, TIME_SLOTS)
+        self._poller = None
+
+    async def seed(self):
+        """Populate empty catalog collections with the built-in data.
+
+        Version 0 means seeding has not finished. Every worker starting on a
+        fresh database writes the same documents, and the first to finish
+        publishes version 1, so a seeder that dies halfway is completed by
+        the next one to start.
+        """
+        meta = await self.database.catalog_meta.find_one_and_update(
+            {"_id": self.META_ID},
+            {"$setOnInsert": {"version": 0, "time_slots": TIME_SLOTS}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if meta["version"]:
+            await self.backfill_categories()
+            return
+        for service in SERVICES:
+            await self.database.services.replace_one({"_id": service["id"]}, service, upsert=True)
+        for stylist in STYLISTS:
+            await self.database.stylists.replace_one({"_id": stylist["id"]}, stylist, upsert=True)
+        result = await self.database.catalog_meta.update_one(
+            {"_id": self.META_ID, "version": 0}, {"$set": {"version": 1}}
+        )
+        if result.modified_count:
+            logger.info("Seeded catalog collections with built-in data")
+
+    async def backfill_categories(self):
+        """Give built-in stylists seeded before categories were stored their categories"""
+        backfilled = 0
+        for stylist in STYLISTS:
+            if "categories" in stylist:
+                result = await self.database.stylists.update_one(
+                    {"_id": stylist["id"], "categories": {"$exists": False}},
+                    {"$set": {"categories": stylist["categories"]}}
+                )
+                backfilled += result.modified_count
+        if backfilled:
+            await self.bump_version()
+            logger.info(f"Backfilled categories for {backfilled} stylists")
+
+    async def bump_version(self):
+        """Mark the catalog as changed so every worker reloads it"""
+        await self.database.catalog_meta.update_one({"_id": self.META_ID}, {"$inc": {"version": 1}})
+
+    async def load(self):
+        meta = await self.database.catalog_meta.find_one({"_id": self.META_ID})
+        if meta is None or not meta["version"]:
+            # Not seeded yet (or still being seeded): keep serving the built-in data
+            return
+        services = await self.database.services.find({}, {"_id": 0}).sort("id", ASCENDING).to_list(None)
+        stylists = await self.database.stylists.find({}, {"_id": 0}).sort("id", ASCENDING).to_list(None)
+        previous = self.snapshot
+        self.snapshot = CatalogSnapshot(meta["version"], services, stylists, meta["time_slots"])
+        if self.snapshot.time_slots != previous.time_slots:
+            # Occupancy bitmaps are laid out by slot position
+            availability.invalidate()
+        logger.info(f"Loaded catalog version {self.snapshot.version}")
+
+    async def refresh(self):
+        """Reload the catalog if its version changed since the last load"""
+        meta = await self.database.catalog_meta.find_one({"_id": self.META_ID}, {"version": 1})
+        if meta and meta["version"] != self.snapshot.version:
+            await self.load()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing catalog: {str(e)}")
+
+    def start(self):
+        if self._poller is None:
+            self._poller = asyncio.ensure_future(self._poll())
+
+    def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+
+catalog = Catalog(db, poll_interval=float(os.environ.get('CATALOG_POLL_INTERVAL', '30')))
+
+
+# ==================== Indexes ====================
+
+# Created on its own by ensure_reference_index(): a duplicate reference
+# fails it, and must not take the other bookings indexes down with it
+REFERENCE_INDEX = IndexModel([("reference", ASCENDING)], unique=True, name="reference_unique")
+
+INDEXES = {
+    "bookings": [
+        # Availability only ever looks at active bookings
+        IndexModel(
+            [("date", ASCENDING), ("stylist_id", ASCENDING), ("time", ASCENDING)],
+            partialFilterExpression={"status": "confirmed"},
+            name="active_date_stylist_time"
+        ),
+        IndexModel(
+            [("start_at", ASCENDING), ("stylist_id", ASCENDING)],
+            partialFilterExpression={"status": "confirmed"},
+            name="active_start_at_stylist"
+        ),
+        IndexModel([("start_at", ASCENDING)], name="start_at"),
+        IndexModel(
+            [("series_id", ASCENDING), ("start_at", ASCENDING)],
+            partialFilterExpression={"series_id": {"$exists": True}},
+            name="series_start_at"
+        ),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id_desc"),
+        IndexModel(
+            [("stylist_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="stylist_created_at_id_desc"
+        ),
+    ],
+    "slot_claims": [
+        IndexModel([("booking_id", ASCENDING)], name="booking_id"),
+        # Only waitlist holds carry expires_at
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+    "waitlist": [
+        IndexModel(
+            [("date", ASCENDING), ("stylist_id", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING)],
+            name="date_stylist_status_created"
+        ),
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel(
+            [("offer.expires_at", ASCENDING)],
+            partialFilterExpression={"status": "offered"},
+            name="offered_expires_at"
+        ),
+    ],
+    "outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        IndexModel([("booking_id", ASCENDING)], name="booking_id"),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+    "contact_submissions": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id_desc"),
+    ],
+    "daily_stats": [
+        IndexModel([("date", ASCENDING), ("stylist_id", ASCENDING)], name="date_stylist"),
+    ],
+    # Clients are keyed by normalized email (_id)
+    "clients": [
+        IndexModel([("phone_digits", ASCENDING)], name="phone_digits"),
+    ],
+}
+
+# Admin listings page newest-first on (created_at, _id)
+PAGE_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+
+def page_query(query, created_at, _id):
+    """`query` limited to the documents after (created_at, _id) in PAGE_SORT order"""
     return {
-        "date": date,
-        "stylist_id": stylist_id,
-        "available_slots": available_slots
+        **query,
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": _id}},
+        ],
     }
 
 
-# --- Booking Routes ---
+# Representative query shape of every hot route: (route, collection, filter, sort)
+HOT_QUERIES = [
+    ("GET /api/timeslots", "bookings", occupancy_query(None, ["2025-01-25"]), None),
+    ("GET /api/timeslots/range", "bookings",
+     occupancy_query(None, [f"2025-01-{day}" for day in range(20, 27)]), None),
+    ("POST /api/bookings/series", "bookings", occupancy_query(None, ["2025-01-25", "2025-02-01", "2025-02-08"]), None),
+    ("GET /api/bookings/{reference}", "bookings", {"reference": "LUNA-000000"}, None),
+    ("GET /api/bookings/series/{series_id}", "bookings", {"series_id": "00000000"}, [("start_at", ASCENDING)]),
+    ("GET /api/bookings", "bookings", {}, PAGE_SORT),
+    ("GET /api/bookings?stylist_id", "bookings", {"stylist_id": 1}, PAGE_SORT),
+    ("GET /api/bookings?after", "bookings", page_query({}, datetime(2025, 1, 25), ObjectId("0" * 24)), PAGE_SORT),
+    ("GET /api/bookings?stylist_id&after", "bookings",
+     page_query({"stylist_id": 1}, datetime(2025, 1, 25), ObjectId("0" * 24)), PAGE_SORT),
+    ("GET /api/bookings?date_from&date_to", "bookings",
+     {"start_at": {"$gte": datetime(2025, 1, 1, 5), "$lt": datetime(2025, 2, 1, 5)}}, PAGE_SORT),
+    ("GET /api/contact", "contact_submissions", {}, PAGE_SORT),
+    ("GET /api/contact?after", "contact_submissions",
+     page_query({}, datetime(2025, 1, 25), ObjectId("0" * 24)), PAGE_SORT),
+    ("GET /api/stats", "daily_stats", {"date": {"$gte": "2025-01-01", "$lte": "2025-01-31"}}, None),
+    ("GET /api/clients/{email}/bookings", "bookings", {"reference": {"$in": ["LUNA-000000"]}}, None),
+    ("GET /api/clients?phone", "clients", {"phone_digits": "15550000000"}, None),
+    ("waitlist match", "waitlist",
+     {"date": "2025-01-25", "stylist_id": {"$in": [1, ANY_STYLIST_ID]}, "status": "waiting"},
+     [("created_at", ASCENDING)]),
+    ("waitlist offer expiry", "waitlist", {"status": "offered", "offer.expires_at": {"$lte": datetime(2025, 1, 25)}}, None),
+]
 
-@api_router.post("/bookings", response_model=dict, status_code=201)
-async def create_booking(booking_data: BookingCreate):
-    """Create a new booking appointment with single or multiple services"""
-    try:
-        reference = generate_reference()
-        
-        # Handle multiple services
-        if booking_data.services and len(booking_data.services) > 0:
-            services_list = [s.dict() for s in booking_data.services]
-            booking = Booking(
-                reference=reference,
-                services=services_list,
-                total_duration=booking_data.total_duration,
-                total_price_min=booking_data.total_price_min,
-                date=booking_data.date,
-                time=booking_data.time,
-                stylist_id=booking_data.stylist_id,
-                stylist_name=booking_data.stylist_name,
-                client_first_name=booking_data.client.first_name,
-                client_last_name=booking_data.client.last_name,
-                client_email=booking_data.client.email,
-                client_phone=booking_data.client.phone,
-                client_notes=booking_data.client.notes or ""
-            )
-        else:
-            # Legacy single service booking
-            booking = Booking(
-                reference=reference,
-                service_category=booking_data.service_category,
-                service_name=booking_data.service_name,
-                service_price=booking_data.service_price,
-                service_duration=booking_data.service_duration,
-                date=booking_data.date,
-                time=booking_data.time,
-                stylist_id=booking_data.stylist_id,
-                stylist_name=booking_data.stylist_name,
-                client_first_name=booking_data.client.first_name,
-                client_last_name=booking_data.client.last_name,
-                client_email=booking_data.client.email,
-                client_phone=booking_data.client.phone,
-                client_notes=booking_data.client.notes or ""
-            )
-        
-        booking_dict = booking.dict()
-        booking_dict["created_at"] = datetime.utcnow()
-        
-        await db.bookings.insert_one(booking_dict)
-        
-        logger.info(f"Booking created: {reference} for {booking_data.client.email}")
-        
-        # Return appropriate response based on booking type
-        response = {
-            "id": booking.id,
-            "reference": reference,
-            "status": "confirmed",
-            "date": booking.date,
-            "time": booking.time,
-            "stylist_name": booking.stylist_name,
-            "client_name": f"{booking.client_first_name} {booking.client_last_name}",
-            "client_email": booking.client_email,
-            "created_at": booking.created_at.isoformat()
-        }
-        
-        if booking.services:
-            response["services"] = booking.services
-            response["total_duration"] = booking.total_duration
-            response["total_price_min"] = booking.total_price_min
-        else:
-            response["service_category"] = booking.service_category
-            response["service_name"] = booking.service_name
-            response["service_price"] = booking.service_price
-            response["service_duration"] = booking.service_duration
-        
-        return response
-    except Exception as e:
-        logger.error(f"Error creating booking: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to create booking")
 
+# Indexes earlier versions created that nothing uses any more
+OBSOLETE_INDEXES = {
+    # Same keys as active_date_stylist_time, without its partial filter
+    "bookings": ["date_stylist_time"],
+}
 
-@api_router.get("/bookings", response_model=dict)
-async def get_bookings():
-    """Get all bookings (admin use)"""
-    bookings = []
-    async for booking in db.bookings.find().sort("created_at", -1):
-        booking["_id"] = str(booking["_id"])
-        if "created_at" in booking and isinstance(booking["created_at"], datetime):
-            booking["created_at"] = booking["created_at"].isoformat()
-        bookings.append(booking)
-    return {"bookings": bookings}
 
+async def duplicate_references(collection, limit=20):
+    """Up to `limit` booking references stored more than once, with their counts"""
+    pipeline = [
+        {"$group": {"_id": "$reference", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [(group["_id"], group["count"]) async for group in collection.aggregate(pipeline)]
 
-@api_router.get("/bookings/{reference}", response_model=dict)
-async def get_booking_by_reference(reference: str):
-    """Get booking by reference number"""
-    booking = await db.bookings.find_one({"reference": reference})
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
-    booking["_id"] = str(booking["_id"])
-    if "created_at" in booking and isinstance(booking["created_at"], datetime):
-        booking["created_at"] = booking["created_at"].isoformat()
-    return booking
 
+async def ensure_reference_index(database):
+    """Create the unique reference index, raising if existing bookings share a reference"""
+    if REFERENCE_INDEX.document["name"] in await database.bookings.index_information():
+        return
+    duplicates = await duplicate_references(database.bookings)
+    if duplicates:
+        listed = ", ".join(f"{reference} ({count}x)" for reference, count in duplicates)
+        raise RuntimeError(f"Cannot create unique index on bookings.reference; duplicated references: {listed}")
+    await database.bookings.create_indexes([REFERENCE_INDEX])
+    logger.info("Indexes ready on bookings: reference_unique")
 
-# --- Contact Routes ---
 
-@api_router.post("/contact", response_model=dict, status_code=201)
-async def create_contact(contact_data: ContactCreate):
-    """Submit a contact form inquiry"""
+async def ensure_indexes(database):
+    """Create the indexes declared in INDEXES (no-op for ones that already exist).
+
+    Raises if the unique reference index cannot be created, so a worker never
+    serves bookings without it.
+    """
+    for collection, names in OBSOLETE_INDEXES.items():
+        existing = await database[collection].index_information()
+        for name in names:
+            if name in existing:
+                await database[collection].drop_index(name)
+                logger.info(f"Dropped obsolete index {name} on {collection}")
+    for collection, indexes in INDEXES.items():
+        try:
+            names = await database[collection].create_indexes(indexes)
+            logger.info(f"Indexes ready on {collection}: {', '.join(names)}")
+        except OperationFailure as e:
+            logger.error(f"Failed to create indexes on {collection}: {str(e)}")
+    await ensure_reference_index(database)
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+async def find_collscans(database):
+    """Return the HOT_QUERIES routes whose winning plan is a collection scan"""
+    offenders = []
+    for route, collection, query, sort in HOT_QUERIES:
+        cursor = database[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            offenders.append(route)
+    return offenders
+
+
+# ==================== Pagination ====================
+
+def encode_cursor(doc):
+    """Opaque keyset cursor pointing just past `doc` in PAGE_SORT order"""
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(after):
+    """Turn a cursor from encode_cursor() back into (created_at, _id)"""
     try:
-        contact = Contact(
-            first_name=contact_data.first_name,
-            last_name=contact_data.last_name,
-            email=contact_data.email,
-            subject=contact_data.subject,
-            message=contact_data.message
-        )
-        
-        contact_dict = contact.dict()
-        contact_dict["created_at"] = datetime.utcnow()
-        
-        await db.contact_submissions.insert_one(contact_dict)
-        
-        logger.info(f"Contact form submitted by {contact_data.email}")
-        
+        created_at, _id = base64.urlsafe_b64decode(after.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(_id)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def build_projection(fields=None, exclude=None):
+    """Mongo projection from comma-separated `fields` / `exclude` query params.
+
+    The cursor keys (created_at, _id) are always kept so the next page can be
+    requested.
+    """
+    if fields:
+        projection = {name.strip(): 1 for name in fields.split(",") if name.strip()}
+        projection["created_at"] = 1
+        return projection
+    if exclude:
         return {
-            "id": contact.id,
-            "status": "received",
-            "message": "Thank you for your message. We'll get back to you soon.",
-            "created_at": contact.created_at.isoformat()
-        }
-    except Exception as e:
-        logger.error(f"Error submitting contact form: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to submit contact form")
+            name.strip(): 0 for name in exclude.split(",")
+            if name.strip() and name.strip() not in ("created_at", "_id")
+        } or None
+    return None
 
 
-@api_router.get("/contact", response_model=dict)
-async def get_contact_submissions():
-    """Get all contact submissions (admin use)"""
-    contacts = []
-    async for contact in db.contact_submissions.find().sort("created_at", -1):
-        contact["_id"] = str(contact["_id"])
-        if "created_at" in contact and isinstance(contact["created_at"], datetime):
-            contact["created_at"] = contact["created_at"].isoformat()
-        contacts.append(contact)
-    return {"contacts": contacts}
+async def fetch_page(collection, query, limit, after=None, projection=None):
+    """Fetch one newest-first page of documents; returns (documents, next_cursor)"""
+    if after:
+        query = page_query(query, *decode_cursor(after))
+    documents = await collection.find(query, projection).sort(PAGE_SORT).limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+    documents = documents[:limit]
+    if not FAST_JSON:
+        prepare_documents(documents)
+    return documents, next_cursor
 
 
-# Include the router in the main app
-app.include_router(api_router)
+def booking_query(date_from=None, date_to=None, stylist_id=None, status=None):
+    """Mongo filter for the admin booking listing/export parameters"""
+    query = {}
+    try:
+        if date_from:
+            query.setdefault("start_at", {})["$gte"] = salon_day_bounds(date_from)[0]
+        if date_to:
+            query.setdefault("start_at", {})["$lt"] = salon_day_bounds(date_to)[1]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if stylist_id:
+        query["stylist_id"] = stylist_id
+    if status:
+        query["status"] = status
+    return query
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+# ==================== Export ====================
+
+BOOKING_EXPORT_FIELDS = [
+    "reference", "status", "date", "time", "stylist_id", "stylist_name",
+    "service_category", "service_name", "service_price", "service_duration",
+    "services", "total_duration", "total_price_min",
+    "client_first_name", "client_last_name", "client_email", "client_phone",
+    "client_notes", "created_at"
+]
+
+CONTACT_EXPORT_FIELDS = [
+    "id", "status", "first_name", "last_name", "email", "subject", "message", "created_at"
+]
+
+
+def _export_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=_export_default)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def stream_export(cursor, export_format, columns, batch_size):
+    """Yield NDJSON or CSV text from a Motor cursor, `batch_size` rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(columns)
+    rows = 0
+    async for doc in cursor:
+        if export_format == "csv":
+            writer.writerow([_csv_value(doc.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps(doc, default=_export_default))
+            buffer.write("\n")
+        rows += 1
+        if rows % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(collection, query, export_format, columns, batch_size, filename):
+    """StreamingResponse over a newest-first export of `collection`"""
+    cursor = collection.find(query, {"_id": 0}).sort(PAGE_SORT).batch_size(batch_size)
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    extension = "csv" if export_format == "csv" else "ndjson"
+    return StreamingResponse(
+        stream_export(cursor, export_format, columns, batch_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+    )
+
+
+# ==================== Availability Engine ====================
+
+def real_stylist_masks(masks):
+    """Occupancy of every real stylist; legacy "Any Available" bookings block them all"""
+    shared = masks.get(ANY_STYLIST_ID, 0)
+    return {stylist["id"]: masks.get(stylist["id"], 0) | shared for stylist in catalog.snapshot.real_stylists}
+
+
+def day_start_mask(masks, stylist_id, duration):
+    """Start slots that fit `duration` minutes for a stylist, or for at least
+    one real stylist when "Any Available" (or no stylist) is requested
+    """
+    if stylist_id and stylist_id != ANY_STYLIST_ID:
+        return free_start_mask(masks.get(stylist_id, 0), duration)
+    starts = 0
+    for occupied in real_stylist_masks(masks).values():
+        starts |= free_start_mask(occupied, duration)
+    return starts
+
+
+class AvailabilityEngine:
+    """Occupancy bitmaps of the catalog's time slots per stylist per date.
+
+    Bit i of a stylist's mask is set when the i-th time slot is taken. A date is
+    loaded from Mongo once and then kept current by occupy()/release() as
+    bookings are created or cancelled. Entries expire after `ttl` seconds so
+    bookings made through other workers are eventually picked up.
+    Every change that flips bits is passed to `listeners` as
+    (date, stylist_id, mask, occupied). Slots held for waitlist offers (slot
+    claims in `holds` that carry an expiry) count as taken.
+    """
+
+    def __init__(self, collection, holds=None, ttl=60.0, max_dates=512, min_reload_interval=1.0):
+        self.collection = collection
+        self.holds = holds
+        self.ttl = ttl
+        self.min_reload_interval = min_reload_interval
+        self.max_dates = max_dates
+        self.listeners = []
+        self._days = OrderedDict()  # date -> (loaded_at, {stylist_id: mask})
+        self._loading = {}  # date -> in-flight load future
+        self._pending = {}  # date -> updates received while loading
+
+    async def day(self, date):
+        """Return {stylist_id: occupancy mask} for a date, loading it if needed"""
+        return (await self.days([date]))[date]
+
+    async def days(self, dates):
+        """Return {date: {stylist_id: mask}}, loading all missing dates in one query"""
+        result = {}
+        waiting = {}
+        missing = []
+        now = monotonic()
+        for date in dates:
+            entry = self._days.get(date)
+            if entry and now - entry[0] < self.ttl:
+                self._days.move_to_end(date)
+                result[date] = entry[1]
+            elif date in self._loading:
+                waiting[date] = self._loading[date]
+            else:
+                missing.append(date)
+        if missing:
+            for date in missing:
+                self._pending[date] = []
+            future = asyncio.ensure_future(self._load(missing))
+            for date in missing:
+                self._loading[date] = waiting[date] = future
+        for date, future in waiting.items():
+            result[date] = (await asyncio.shield(future))[date]
+        return result
+
+    async def reloaded(self, date):
+        """Re-read a date from Mongo, unless it was loaded within `min_reload_interval` seconds"""
+        entry = self._days.get(date)
+        if entry is None or monotonic() - entry[0] >= self.min_reload_interval:
+            self.invalidate(date)
+        return await self.day(date)
+
+    async def occupied(self, date, stylist_id):
+        """Occupancy mask of one stylist on a date"""
+        masks = await self.day(date)
+        return masks.get(stylist_id, 0)
+
+    async def stylist_masks(self, date):
+        """Occupancy of every real stylist; legacy "Any Available" bookings block them all"""
+        return real_stylist_masks(await self.day(date))
+
+    async def start_mask(self, date, stylist_id, duration):
+        """Start slots on a date that fit `duration` minutes (see day_start_mask())"""
+        return day_start_mask(await self.day(date), stylist_id, duration)
+
+    def occupy(self, date, stylist_id, time, duration):
+        self._update(date, stylist_id, slot_mask(time, duration), True)
+
+    def release(self, date, stylist_id, time, duration):
+        self._update(date, stylist_id, slot_mask(time, duration), False)
+
+    def apply(self, date, stylist_id, mask, occupied):
+        """Apply a change observed elsewhere (e.g. another worker's slot claims)"""
+        self._update(date, stylist_id, mask, occupied)
+
+    def cached(self, date):
+        """{stylist_id: mask} for a date if held in memory (possibly past its ttl), else None"""
+        entry = self._days.get(date)
+        return entry[1] if entry else None
+
+    def invalidate(self, date=None):
+        if date is None:
+            self._days.clear()
+        else:
+            self._days.pop(date, None)
+
+    async def _load(self, dates):
+        try:
+            loaded = {date: {} for date in dates}
+            query = occupancy_query(None, dates)
+            projection = {"date": 1, "time": 1, "stylist_id": 1, "service_duration": 1, "total_duration": 1}
+            async for booking in self.collection.find(query, projection):
+                masks = loaded.get(booking.get("date"))
+                if masks is not None:
+                    self._apply(masks, booking.get("stylist_id"),
+                                slot_mask(booking.get("time"), booking_duration(booking)), True)
+            if self.holds is not None:
+                query = {"expires_at": {"$gt": datetime.utcnow()}, "date": {"$in": dates}}
+                async for claim in self.holds.find(query, {"date": 1, "stylist_id": 1, "time": 1}):
+                    index = catalog.snapshot.slot_index.get(claim["time"])
+                    if index is not None:
+                        self._apply(loaded[claim["date"]], claim["stylist_id"], 1 << index, True)
+            loaded_at = monotonic()
+            for date, masks in loaded.items():
+                for stylist_id, mask, occupied in self._pending.get(date, ()):
+                    self._apply(masks, stylist_id, mask, occupied)
+                self._days[date] = (loaded_at, masks)
+                self._days.move_to_end(date)
+            while len(self._days) > self.max_dates:
+                self._days.popitem(last=False)
+            return loaded
+        finally:
+            for date in dates:
+                self._pending.pop(date, None)
+                self._loading.pop(date, None)
+
+    def _update(self, date, stylist_id, mask, occupied):
+        if not mask:
+            return
+        pending = self._pending.get(date)
+        if pending is not None:
+            pending.append((stylist_id, mask, occupied))
+        entry = self._days.get(date)
+        # Repeats of a change already applied (e.g. echoed by a change stream) are not passed on
+        if entry and not self._apply(entry[1], stylist_id, mask, occupied):
+            return
+        for listener in self.listeners:
+            listener(date, stylist_id, mask, occupied)
+
+    @staticmethod
+    def _apply(masks, stylist_id, mask, occupied):
+        """Set or clear `mask` in a stylist's occupancy; True if any bit changed"""
+        current = masks.get(stylist_id, 0)
+        masks[stylist_id] = current | mask if occupied else current & ~mask
+        return masks[stylist_id] != current
+
+
+# ==================== Slot Claims ====================
+
+def claim_id(date, stylist_id, slot):
+    """Key of the slot claim document; its uniqueness is what prevents double booking"""
+    return f"{date}|{stylist_id}|{slot}"
+
+
+def held_mask(date, stylist_id, held):
+    """Bitmask of the slots on (date, stylist) whose claim ids are in `held`"""
+    mask = 0
+    for i, slot in enumerate(catalog.snapshot.time_slots):
+        if claim_id(date, stylist_id, slot) in held:
+            mask |= 1 << i
+    return mask
+
+
+def slot_claims(booking, expires_at=None):
+    """Claim documents for every slot a booking spans"""
+    mask = slot_mask(booking["time"], booking_duration(booking))
+    now = datetime.utcnow()
+    claims = [
+        {
+            "_id": claim_id(booking["date"], booking["stylist_id"], slot),
+            "booking_id": booking["id"],
+            "date": booking["date"],
+            "stylist_id": booking["stylist_id"],
+            "time": slot,
+            "created_at": now
+        }
+        for i, slot in enumerate(catalog.snapshot.time_slots)
+        if mask >> i & 1
+    ]
+    if expires_at is not None:
+        # Temporary holds (waitlist offers) are dropped by the TTL index if never released
+        for claim in claims:
+            claim["expires_at"] = expires_at
+    return claims
+
+
+async def claim_slots(booking, held=(), expires_at=None):
+    """Atomically claim every slot a booking spans; False if any is already taken.
+
+    One claim document per (date, stylist, slot) is inserted with an ordered
+    insert_many, so a clash on any slot stops the insert and only bookings
+    competing for the same stylist and slots contend with each other. Claim
+    ids in `held` already belong to the booking (when rescheduling or taking
+    up a waitlist offer) and are skipped. Claims with `expires_at` are holds.
+    """
+    claims = [claim for claim in slot_claims(booking, expires_at) if claim["_id"] not in held]
+    if not claims:
+        return True
+    try:
+        await db.slot_claims.insert_many(claims, ordered=True)
+    except BulkWriteError as e:
+        # Only undo what this call inserted: a clashing claim can belong to
+        # the same booking id (a concurrent offer for one waitlist entry)
+        inserted = claims[:e.details["nInserted"]]
+        if inserted:
+            await release_slots(booking["id"], [claim["_id"] for claim in inserted])
+        return False
+    return True
+
+
+async def claim_many(bookings, held=()):
+    """Claim the slots of several bookings all-or-nothing; returns the dates that clashed.
+
+    Every claim goes into one unordered insert_many. If any clash, the claims
+    that did get in are removed again and nothing is held. Claim ids in
+    `held` already belong to the bookings and are skipped.
+    """
+    claims = [claim for booking in bookings for claim in slot_claims(booking) if claim["_id"] not in held]
+    if not claims:
+        return []
+    try:
+        await db.slot_claims.insert_many(claims, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details["writeErrors"]}
+        inserted = [claim["_id"] for i, claim in enumerate(claims) if i not in failed]
+        if inserted:
+            await db.slot_claims.delete_many({"_id": {"$in": inserted}})
+        return sorted({claims[i]["date"] for i in failed})
+    return []
+
+
+async def release_slots(booking_id, claim_ids=None):
+    """Drop the slot claims held by a booking (all of them, or just `claim_ids`)"""
+    query = {"booking_id": booking_id}
+    if claim_ids is not None:
+        query["_id"] = {"$in": list(claim_ids)}
+    await db.slot_claims.delete_many(query)
+
+
+# ==================== Stylist Assignment ====================
+
+def booking_categories(booking):
+    """Service categories a booking covers (single or multiple services)"""
+    if booking.get("services"):
+        return {service.get("category") for service in booking["services"]}
+    return {booking.get("service_category")}
+
+
+def least_booked_policy(candidates, masks, booking):
+    """Prefer the stylist with the fewest booked slots that day"""
+    return sorted(candidates, key=lambda stylist: masks[stylist["id"]].bit_count())
+
+
+def specialty_policy(candidates, masks, booking):
+    """Prefer stylists specialising in the booked categories, then the least booked"""
+    categories = booking_categories(booking)
+    return sorted(
+        candidates,
+        key=lambda stylist: (
+            -len(categories & catalog.snapshot.stylist_categories.get(stylist["id"], set())),
+            masks[stylist["id"]].bit_count()
+        )
+    )
+
+
+ASSIGNMENT_POLICIES = {
+    "least_booked": least_booked_policy,
+    "specialty": specialty_policy,
+}
+
+assignment_policy = ASSIGNMENT_POLICIES[os.environ.get('STYLIST_ASSIGNMENT_POLICY', 'specialty')]
+
+
+async def assign_stylist(booking, current=None, held=()):
+    """Assign an "Any Available" booking to a free real stylist and claim their slots.
+
+    Candidates come from the date's cached occupancy (one bookings query per
+    date) and are tried in policy order; the booking dict is updated with the
+    stylist that was claimed. When rescheduling, `current` is the booking as
+    stored: its own slots do not count against it and their claims (`held`)
+    are kept. Returns False when nobody is free.
+    """
+    span = slot_mask(booking["time"], booking_duration(booking))
+
+    def free_stylists(masks):
+        if current is not None and current["date"] == booking["date"] and current["stylist_id"] in masks:
+            masks[current["stylist_id"]] &= ~slot_mask(current["time"], booking_duration(current))
+        return [stylist for stylist in catalog.snapshot.real_stylists if not masks[stylist["id"]] & span]
+
+    masks = await availability.stylist_masks(booking["date"])
+    candidates = free_stylists(masks)
+    if not candidates:
+        # The cache may predate a cancellation made through another worker
+        masks = real_stylist_masks(await availability.reloaded(booking["date"]))
+        candidates = free_stylists(masks)
+    for stylist in assignment_policy(candidates, masks, booking):
+        booking["stylist_id"] = stylist["id"]
+        booking["stylist_name"] = stylist["name"]
+        if await claim_slots(booking, held=held):
+            return True
+    return False
+
+
+availability = AvailabilityEngine(
+    db.bookings,
+    holds=db.slot_claims,
+    ttl=float(os.environ.get('AVAILABILITY_CACHE_TTL', '60'))
+)
+
+
+# ==================== Live Availability ====================
+
+class AvailabilityHub:
+    """In-process pub/sub fanning availability changes out to SSE viewers.
+
+    Viewers subscribe to a (date, stylist_id, duration) view. The hub listens
+    to the availability engine; on each change it computes a view's start
+    times once from the in-memory occupancy and queues the same serialized
+    event to every viewer of that view, so N viewers cost one computation per
+    change instead of N polling queries. Each event carries the full list of
+    available start times, so a slow viewer whose queue is full just loses
+    its oldest event.
+    """
+
+    def __init__(self, engine, queue_size=16):
+        self.engine = engine
+        self.queue_size = queue_size
+        self._views = {}  # date -> {(stylist_id, duration): set of queues}
+        engine.listeners.append(self.publish)
+
+    def subscribe(self, date, stylist_id, duration):
+        queue = asyncio.Queue(self.queue_size)
+        self._views.setdefault(date, {}).setdefault((stylist_id, duration), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, date, stylist_id, duration, queue):
+        views = self._views.get(date, {})
+        viewers = views.get((stylist_id, duration))
+        if viewers is None:
+            return
+        viewers.discard(queue)
+        if not viewers:
+            del views[(stylist_id, duration)]
+            if not views:
+                del self._views[date]
+
+    def publish(self, date, stylist_id, mask, occupied):
+        views = self._views.get(date)
+        if not views:
+            return
+        kind = "slots_taken" if occupied else "slots_freed"
+        slots = slots_from_mask(mask)
+        masks = self.engine.cached(date)
+        for (view_stylist, duration), queues in views.items():
+            # A stylist's view only changes with their own (or legacy "Any Available") bookings
+            if view_stylist not in (None, ANY_STYLIST_ID, stylist_id) and stylist_id != ANY_STYLIST_ID:
+                continue
+            event = {"date": date, "stylist_id": stylist_id, "slots": slots}
+            if masks is not None:
+                event["available_slots"] = slots_from_mask(day_start_mask(masks, view_stylist, duration))
+            message = f"event: {kind}\ndata: {json.dumps(event)}\n\n"
+            for queue in queues:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(message)
+
+
+class ClaimChangeStream:
+    """Feeds slot claims made by every worker into this worker's availability engine.
+
+    Watches inserts and deletes on `slot_claims` with a Mongo change stream
+    (requires a replica set). Claim ids encode "date|stylist_id|time", so
+    deletes need no document lookup. Changes this worker already applied are
+    ignored by the engine, so viewers see each change once. Waitlist holds
+    count as taken, as in local mode.
+    """
+
+    def __init__(self, collection, engine, retry_interval=5.0):
+        self.collection = collection
+        self.engine = engine
+        self.retry_interval = retry_interval
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        resume_token = None
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "delete"]}}}]
+        while True:
+            try:
+                async with self.collection.watch(pipeline, resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self.apply(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Slot claim change stream failed, retrying: {str(e)}")
+                await asyncio.sleep(self.retry_interval)
+
+    def apply(self, change):
+        date, stylist_id, time = change["documentKey"]["_id"].split("|")
+        index = catalog.snapshot.slot_index.get(time)
+        if index is not None:
+            self.engine.apply(date, int(stylist_id), 1 << index, change["operationType"] == "insert")
+
+
+availability_hub = AvailabilityHub(availability)
+LIVE_AVAILABILITY_SOURCE = os.environ.get('LIVE_AVAILABILITY_SOURCE', 'local')
+claim_change_stream = ClaimChangeStream(db.slot_claims, availability)
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))
+
+
+# ==================== Write-behind ====================
+
+class BatchWriter:
+    """Write-behind queue that coalesces inserts into insert_many batches.
+
+    Documents are acknowledged as soon as they are queued and flushed when
+    `batch_size` have accumulated or `flush_interval` seconds after the first
+    one arrived. A full queue makes put() wait up to `put_timeout` seconds and
+    then fail, pushing back on clients instead of buffering without bound.
+    stop() flushes everything still queued.
+    """
+
+    def __init__(self, collection, batch_size=100, flush_interval=0.5, max_queue=10000,
+                 put_timeout=1.0, retries=3):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self._queue = None
+        self._full = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._full = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def put(self, document):
+        """Queue a document; raises asyncio.TimeoutError if the queue stays full"""
+        await asyncio.wait_for(self._queue.put(document), self.put_timeout)
+        if self._queue.qsize() >= self.batch_size:
+            self._full.set()
+
+    async def stop(self):
+        """Flush everything queued and stop the writer"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        self._full.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            self._full.clear()
+            if batch[0] is not None and self._queue.qsize() + 1 < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [document for document in batch if document is not None]
+                while not self._queue.empty():
+                    document = self._queue.get_nowait()
+                    if document is not None:
+                        batch.append(document)
+            for start in range(0, len(batch), self.batch_size):
+                await self._flush(batch[start:start + self.batch_size])
+
+    async def _flush(self, batch):
+        if not batch:
+            return
+        for attempt in range(1, self.retries + 1):
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                return
+            except BulkWriteError as e:
+                # Documents already written by an earlier attempt fail as duplicates
+                if all(error.get("code") == 11000 for error in e.details.get("writeErrors", [])):
+                    return
+                logger.error(f"Batch insert into {self.collection.name} failed: {str(e)}")
+            except Exception as e:
+                logger.error(f"Batch insert into {self.collection.name} failed: {str(e)}")
+            if attempt < self.retries:
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        logger.error(f"Dropped {len(batch)} documents for {self.collection.name} after {self.retries} attempts")
+
+
+contact_writer = BatchWriter(
+    db.contact_submissions,
+    batch_size=int(os.environ.get('CONTACT_BATCH_SIZE', '100')),
+    flush_interval=float(os.environ.get('CONTACT_FLUSH_INTERVAL', '0.5')),
+    max_queue=int(os.environ.get('CONTACT_QUEUE_SIZE', '10000'))
+)
+CONTACT_WRITE_BEHIND = os.environ.get('CONTACT_WRITE_BEHIND', '0') == '1'
+
+
+# ==================== Notifications ====================
+
+def outbox_entries(booking):
+    """Confirmation and day-before reminder outbox documents for a new booking"""
+    now = datetime.utcnow()
+    payload = {
+        "reference": booking["reference"],
+        "client_name": f"{booking['client_first_name']} {booking['client_last_name']}",
+        "date": booking["date"],
+        "time": booking["time"],
+        "stylist_name": booking["stylist_name"],
+        "services": service_summary(booking),
+    }
+    entries = [("confirmation", now)]
+    reminder_at = appointment_start(booking["date"], booking["time"]) - timedelta(days=1)
+    if reminder_at > now:
+        entries.append(("reminder", reminder_at))
+    return [
+        {
+            "_id": f"{booking['id']}|{kind}",
+            "kind": kind,
+            "booking_id": booking["id"],
+            "to": booking["client_email"],
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": send_at,
+            "created_at": now,
+        }
+        for kind, send_at in entries
+    ]
+
+
+def render_notification(entry, sender):
+    """Build the email for an outbox entry"""
+    payload = entry["payload"]
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = entry["to"]
+    if entry["kind"] == "waitlist_offer":
+        message["Subject"] = "An appointment opened up at Luna Hair Salon"
+        message.set_content(
+            f"Hi {payload['client_name']},\n\n"
+            "A time on your waitlist request is now free and we are holding it for you.\n\n"
+            f"Date: {payload['date']} at {payload['time']}\n"
+            f"Stylist: {payload['stylist_name']}\n"
+            f"Services: {payload['services']}\n\n"
+            f"The hold expires at {payload['expires_at']}. Accept it with waitlist id {payload['reference']}.\n"
+        )
+        return message
+    if entry["kind"] == "reminder":
+        message["Subject"] = f"Reminder: your Luna Hair Salon appointment tomorrow ({payload['reference']})"
+        opening = "This is a reminder of your appointment tomorrow."
+    else:
+        message["Subject"] = f"Your Luna Hair Salon booking is confirmed ({payload['reference']})"
+        opening = "Thank you for booking with Luna Hair Salon."
+    message.set_content(
+        f"Hi {payload['client_name']},\n\n"
+        f"{opening}\n\n"
+        f"Reference: {payload['reference']}\n"
+        f"Date: {payload['date']} at {payload['time']}\n"
+        f"Stylist: {payload['stylist_name']}\n"
+        f"Services: {payload['services']}\n\n"
+        "We look forward to seeing you at CF Rideau Centre.\n"
+    )
+    return message
+
+
+class SMTPSender:
+    """Sends batches of emails over one SMTP connection per batch"""
+
+    def __init__(self, host, port=25, username=None, password=None, sender="bookings@lunasalon.ca",
+                 starttls=False):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.starttls = starttls
+
+    async def send_batch(self, messages):
+        """Send messages; returns one exception (or None on success) per message"""
+        return await asyncio.to_thread(self._send_batch, messages)
+
+    def _send_batch(self, messages):
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password)
+                results = []
+                for message in messages:
+                    try:
+                        smtp.send_message(message)
+                        results.append(None)
+                    except smtplib.SMTPException as e:
+                        results.append(e)
+                return results
+        except (OSError, smtplib.SMTPException) as e:
+            return [e] * len(messages)
+
+
+class NotificationDispatcher:
+    """Delivers outbox entries in the background, independent of request latency.
+
+    Due entries are leased one at a time with find_one_and_update, so several
+    workers can dispatch from the same outbox; a lease that is not completed
+    (e.g. the worker died) expires and the entry is retried. Claimed entries are
+    split across `concurrency` senders, each using one SMTP connection per
+    chunk. Failures are retried with exponential backoff up to `max_attempts`.
+    """
+
+    def __init__(self, collection, sender, concurrency=4, batch_size=20, poll_interval=5.0,
+                 max_attempts=5, lease=300.0, backoff=60.0):
+        self.collection = collection
+        self.sender = sender
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.backoff = backoff
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Error dispatching notifications: {str(e)}")
+                delivered = 0
+            if delivered < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def dispatch_once(self):
+        """Claim and deliver up to `batch_size` due entries; returns how many were claimed"""
+        entries = []
+        for _ in range(self.batch_size):
+            entry = await self._claim()
+            if entry is None:
+                break
+            entries.append(entry)
+        chunk_size = -(-len(entries) // self.concurrency) or 1
+        await asyncio.gather(*(
+            self._deliver(entries[start:start + chunk_size])
+            for start in range(0, len(entries), chunk_size)
+        ))
+        return len(entries)
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "next_attempt_at": {"$lte": now}},
+            ]},
+            {"$set": {"status": "sending", "next_attempt_at": now + timedelta(seconds=self.lease)}},
+            sort=[("next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _deliver(self, entries):
+        messages = [render_notification(entry, self.sender.sender) for entry in entries]
+        results = await self.sender.send_batch(messages)
+        now = datetime.utcnow()
+        for entry, error in zip(entries, results):
+            if error is None:
+                update = {"$set": {"status": "sent", "sent_at": now}}
+            else:
+                attempts = entry["attempts"] + 1
+                failed = attempts >= self.max_attempts
+                logger.error(f"Failed to send {entry['kind']} for {entry['payload']['reference']}: {str(error)}")
+                update = {"$set": {
+                    "status": "failed" if failed else "pending",
+                    "attempts": attempts,
+                    "last_error": str(error),
+                    "next_attempt_at": now + timedelta(seconds=self.backoff * 2 ** (attempts - 1)),
+                }}
+            await self.collection.update_one({"_id": entry["_id"]}, update)
+
+
+async def queue_booking_notifications(booking, confirm=True):
+    """Write a new booking's confirmation (unless not `confirm`) and reminder to the outbox"""
+    entries = [entry for entry in outbox_entries(booking) if confirm or entry["kind"] != "confirmation"]
+    if not entries:
+        return
+    try:
+        await db.outbox.insert_many(entries, ordered=False)
+    except BulkWriteError:
+        pass  # entries already queued by an earlier attempt
+    except Exception as e:
+        logger.error(f"Failed to queue notifications for {booking['reference']}: {str(e)}")
+
+
+async def cancel_booking_notifications(booking):
+    """Stop any not-yet-sent notifications for a booking that is no longer active"""
+    await db.outbox.update_many(
+        {"booking_id": booking["id"], "status": "pending"},
+        {"$set": {"status": "cancelled"}}
+    )
+
+
+async def reschedule_booking_notifications(booking):
+    """Point a rescheduled booking's pending notifications at its new appointment"""
+    await db.outbox.update_many(
+        {"booking_id": booking["id"], "status": "pending"},
+        {"$set": {
+            "payload.date": booking["date"],
+            "payload.time": booking["time"],
+            "payload.stylist_name": booking["stylist_name"],
+        }}
+    )
+    await db.outbox.update_one(
+        {"_id": f"{booking['id']}|reminder", "status": "pending"},
+        {"$set": {
+            "next_attempt_at": appointment_start(booking["date"], booking["time"]) - timedelta(days=1)
+        }}
+    )
+
+
+def smtp_dispatcher():
+    """Outbox dispatcher for the SMTP_* settings; None when SMTP_HOST is not set"""
+    if not os.environ.get('SMTP_HOST'):
+        return None
+    return NotificationDispatcher(
+        db.outbox,
+        SMTPSender(
+            os.environ['SMTP_HOST'],
+            port=int(os.environ.get('SMTP_PORT', '25')),
+            username=os.environ.get('SMTP_USERNAME'),
+            password=os.environ.get('SMTP_PASSWORD'),
+            sender=os.environ.get('SMTP_FROM', 'bookings@lunasalon.ca'),
+            starttls=os.environ.get('SMTP_STARTTLS', '0') == '1'
+        ),
+        concurrency=int(os.environ.get('NOTIFICATION_CONCURRENCY', '4')),
+        batch_size=int(os.environ.get('NOTIFICATION_BATCH_SIZE', '20'))
+    )
+
+
+# The outbox is always written; "worker" leaves delivery to notification_worker.py
+NOTIFICATION_DISPATCHER = os.environ.get('NOTIFICATION_DISPATCHER', 'inline')
+notifier = smtp_dispatcher() if NOTIFICATION_DISPATCHER == 'inline' else None
+
+
+# ==================== Analytics ====================
+
+# `service` of the per-day, per-stylist totals row in daily_stats
+STATS_TOTAL = ""
+
+
+def stats_id(date, stylist_id, service=STATS_TOTAL):
+    """Key of a daily_stats row; one per date, stylist and service plus a totals row"""
+    return f"{date}|{stylist_id}|{service}"
+
+
+def stats_rows(booking):
+    """{service: (bookings, minutes, revenue_min)} a booking adds to daily_stats"""
+    lines = booking_lines(booking)
+    rows = {STATS_TOTAL: (1, booking_duration(booking), sum(price for _, _, price in lines))}
+    for name, minutes, price in lines:
+        count, total_minutes, revenue = rows.get(name, (0, 0, 0.0))
+        rows[name] = (count + 1, total_minutes + minutes, revenue + price)
+    return rows
+
+
+async def record_booking_stats(booking, sign=1, cancelled=False):
+    """Add (sign=1) or remove (sign=-1) a booking from the daily_stats counters.
+
+    Each row is an upserted $inc, so concurrent bookings never contend on a
+    read-modify-write. Counters are best-effort: a failed update is logged and
+    repaired by the nightly reconcile_daily_stats run.
+    """
+    date, stylist_id = booking["date"], booking["stylist_id"]
+    updates = []
+    for service, (count, minutes, revenue) in stats_rows(booking).items():
+        inc = {"bookings": sign * count, "minutes": sign * minutes, "revenue_min": sign * revenue}
+        if cancelled and service == STATS_TOTAL:
+            inc["cancelled"] = 1
+        updates.append(UpdateOne(
+            {"_id": stats_id(date, stylist_id, service)},
+            {"$inc": inc, "$setOnInsert": {"date": date, "stylist_id": stylist_id, "service": service}},
+            upsert=True
+        ))
+    try:
+        await db.daily_stats.bulk_write(updates, ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to update daily stats for {booking.get('reference')}: {str(e)}")
+
+
+async def reconcile_daily_stats(database, date_from, date_to):
+    """Rebuild daily_stats for appointment dates in [date_from, date_to] from bookings.
+
+    Two aggregation pipelines do the counting in Mongo: one groups bookings
+    per date and stylist, the other unwinds multi-service bookings and groups
+    the service lines per service and price string. Prices are parsed from the (few) distinct price
+    strings afterwards. Returns the number of rows written.
+    """
+    match = {"$match": {"date": {"$gte": date_from, "$lte": date_to}}}
+    totals = await database.bookings.aggregate([
+        match,
+        {"$group": {
+            "_id": {
+                "date": "$date",
+                "stylist_id": "$stylist_id",
+                "cancelled": {"$eq": ["$status", "cancelled"]}
+            },
+            "bookings": {"$sum": 1},
+            "minutes": {"$sum": {"$ifNull": ["$total_duration", {"$ifNull": ["$service_duration", SLOT_MINUTES]}]}}
+        }}
+    ]).to_list(None)
+    lines = await database.bookings.aggregate([
+        match,
+        {"$match": {"status": {"$ne": "cancelled"}}},
+        # Single-service bookings have no `services` and keep their one document
+        {"$unwind": {"path": "$services", "preserveNullAndEmptyArrays": True}},
+        {"$group": {
+            "_id": {
+                "date": "$date",
+                "stylist_id": "$stylist_id",
+                "service": {"$ifNull": ["$services.name", "$service_name"]},
+                "price": {"$ifNull": ["$services.price", "$service_price"]}
+            },
+            "bookings": {"$sum": 1},
+            "minutes": {"$sum": {"$ifNull": ["$services.duration", {"$ifNull": ["$service_duration", 0]}]}}
+        }}
+    ]).to_list(None)
+
+    rows = {}
+
+    def row(date, stylist_id, service):
+        key = stats_id(date, stylist_id, service)
+        if key not in rows:
+            rows[key] = {
+                "date": date, "stylist_id": stylist_id, "service": service,
+                "bookings": 0, "minutes": 0, "revenue_min": 0.0
+            }
+            if service == STATS_TOTAL:
+                rows[key]["cancelled"] = 0
+        return rows[key]
+
+    for group in totals:
+        total = row(group["_id"]["date"], group["_id"]["stylist_id"], STATS_TOTAL)
+        if group["_id"]["cancelled"]:
+            total["cancelled"] += group["bookings"]
+        else:
+            total["bookings"] += group["bookings"]
+            total["minutes"] += group["minutes"]
+    for group in lines:
+        key = group["_id"]
+        revenue = group["bookings"] * min_price(key.get("price"))
+        line = row(key["date"], key["stylist_id"], key.get("service"))
+        line["bookings"] += group["bookings"]
+        line["minutes"] += group["minutes"]
+        line["revenue_min"] += revenue
+        row(key["date"], key["stylist_id"], STATS_TOTAL)["revenue_min"] += revenue
+
+    await database.daily_stats.delete_many({
+        "date": {"$gte": date_from, "$lte": date_to},
+        "_id": {"$nin": list(rows)}
+    })
+    if rows:
+        await database.daily_stats.bulk_write(
+            [ReplaceOne({"_id": key}, doc, upsert=True) for key, doc in rows.items()],
+            ordered=False
+        )
+    return len(rows)
+
+
+def summarize_stats(rows, days, stylist_days):
+    """Fold daily_stats rows into dashboard totals, per-day, per-stylist and per-service figures"""
+    capacity = len(catalog.snapshot.time_slots) * SLOT_MINUTES
+
+    def bucket():
+        return {"bookings": 0, "minutes": 0, "revenue_min": 0.0}
+
+    totals = {**bucket(), "cancelled": 0}
+    by_day = {date: {**bucket(), "cancelled": 0} for date in days}
+    by_stylist = {}
+    by_service = {}
+    for doc in rows:
+        if doc["service"] == STATS_TOTAL:
+            targets = [totals, by_day.setdefault(doc["date"], {**bucket(), "cancelled": 0}),
+                       by_stylist.setdefault(doc["stylist_id"], {**bucket(), "cancelled": 0})]
+            for target in targets:
+                target["cancelled"] += doc.get("cancelled", 0)
+        else:
+            targets = [by_service.setdefault(doc["service"], bucket())]
+        for target in targets:
+            target["bookings"] += doc.get("bookings", 0)
+            target["minutes"] += doc.get("minutes", 0)
+            target["revenue_min"] += doc.get("revenue_min", 0)
+
+    totals["utilization"] = round(totals["minutes"] / (capacity * stylist_days), 4) if stylist_days else 0.0
+    stylist_names = {stylist["id"]: stylist["name"] for stylist in catalog.snapshot.stylists}
+    return {
+        "totals": totals,
+        "days": [{"date": date, **figures} for date, figures in sorted(by_day.items())],
+        "stylists": [
+            {
+                "stylist_id": stylist_id,
+                "stylist_name": stylist_names.get(stylist_id),
+                **figures,
+                "utilization": round(figures["minutes"] / (capacity * len(days)), 4) if days else 0.0
+            }
+            for stylist_id, figures in sorted(by_stylist.items())
+        ],
+        "services": sorted(
+            ({"service": service, **figures} for service, figures in by_service.items()),
+            key=lambda figures: -figures["revenue_min"]
+        )
+    }
+
+
+# ==================== Clients ====================
+
+CLIENT_RECENT_BOOKINGS = int(os.environ.get('CLIENT_RECENT_BOOKINGS', '20'))
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def normalize_phone(phone):
+    """Digits of a phone number, so "+1 (555) 010-2030" and "15550102030" match"""
+    return "".join(ch for ch in phone or "" if ch.isdigit())
+
+
+async def record_client_booking(booking):
+    """Upsert the booking's client, counting it and adding it to their recent references.
+
+    Recent references are kept newest-first and capped at CLIENT_RECENT_BOOKINGS,
+    so a client document stays small however long their history gets.
+    """
+    now = datetime.utcnow()
+    try:
+        await db.clients.update_one(
+            {"_id": normalize_email(booking["client_email"])},
+            {
+                "$set": {
+                    "email": booking["client_email"],
+                    "first_name": booking["client_first_name"],
+                    "last_name": booking["client_last_name"],
+                    "phone": booking["client_phone"],
+                    "phone_digits": normalize_phone(booking["client_phone"]),
+                    "last_booking_at": now,
+                },
+                "$setOnInsert": {"created_at": now},
+                "$inc": {"bookings": 1},
+                "$push": {"recent": {
+                    "$each": [booking["reference"]],
+                    "$position": 0,
+                    "$slice": CLIENT_RECENT_BOOKINGS
+                }},
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to record client for {booking['reference']}: {str(e)}")
+
+
+async def rebuild_clients(database):
+    """Recreate every client document from the bookings collection; returns the client count"""
+    groups = database.bookings.aggregate([
+        {"$sort": {"created_at": DESCENDING}},
+        {"$group": {
+            "_id": {"$toLower": "$client_email"},
+            "email": {"$first": "$client_email"},
+            "first_name": {"$first": "$client_first_name"},
+            "last_name": {"$first": "$client_last_name"},
+            "phone": {"$first": "$client_phone"},
+            "bookings": {"$sum": 1},
+            "recent": {"$push": "$reference"},
+            "created_at": {"$last": "$created_at"},
+            "last_booking_at": {"$first": "$created_at"},
+        }}
+    ], allowDiskUse=True)
+    batch = []
+    count = 0
+    async for client_doc in groups:
+        client_doc["recent"] = client_doc["recent"][:CLIENT_RECENT_BOOKINGS]
+        client_doc["phone_digits"] = normalize_phone(client_doc["phone"])
+        batch.append(ReplaceOne({"_id": client_doc["_id"]}, client_doc, upsert=True))
+        if len(batch) == 500:
+            await database.clients.bulk_write(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        await database.clients.bulk_write(batch, ordered=False)
+        count += len(batch)
+    return count
+
+
+# ==================== Waitlist ====================
+
+def window_mask(entry):
+    """Bitmask of the start slots inside a waitlist entry's acceptable window"""
+    slot_index = catalog.snapshot.slot_index
+    first = slot_index.get(entry["earliest_time"])
+    last = slot_index.get(entry["latest_time"])
+    if first is None or last is None or last < first:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+class WaitlistMatcher:
+    """Offers freed time to waitlisted clients, first come first served.
+
+    Whenever time frees up on a (date, stylist), the waiting entries for that
+    stylist (or "Any Available") on that date are read through the
+    (date, stylist_id, status, created_at) index in line order. The first
+    entry whose window and duration fit is offered a start time, held for
+    `hold_minutes` by slot claims carrying an expiry. Because holds are the
+    same claims bookings take, concurrent matchers (other cancellations, other
+    workers) can never offer or book the same slot twice, and an entry only
+    moves from waiting to offered once. A sweeper expires unanswered offers
+    and passes the time on to the next entry in line.
+    """
+
+    def __init__(self, collection, hold_minutes=15, sweep_interval=15.0, hold_grace_minutes=5):
+        self.collection = collection
+        self.hold = timedelta(minutes=hold_minutes)
+        # Claims outlive the offer so the TTL index never races an acceptance
+        self.hold_grace = timedelta(minutes=hold_grace_minutes)
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.ensure_future(self._sweep())
+
+    def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.expire_offers()
+            except Exception as e:
+                logger.error(f"Error expiring waitlist offers: {str(e)}")
+
+    async def match(self, date, stylist_id):
+        """Offer free time on (date, stylist) to waiting entries in line order; returns offers made"""
+        stylist = catalog.snapshot.stylist_index.get(stylist_id)
+        if stylist is None or stylist_id == ANY_STYLIST_ID:
+            return 0
+        occupied = await availability.occupied(date, stylist_id)
+        offered = 0
+        entries = self.collection.find(
+            {"date": date, "stylist_id": {"$in": [stylist_id, ANY_STYLIST_ID]}, "status": "waiting"}
+        ).sort("created_at", ASCENDING)
+        async for entry in entries:
+            starts = free_start_mask(occupied, entry["duration"]) & window_mask(entry)
+            for time in slots_from_mask(starts):
+                made = await self.offer(entry, stylist, time)
+                if made:
+                    occupied |= slot_mask(time, entry["duration"])
+                    offered += 1
+                if made is not False:
+                    break
+        return offered
+
+    async def offer(self, entry, stylist, time):
+        """Hold `time` with `stylist` for a waiting entry.
+
+        True once offered; False if the slots are taken (try another time);
+        None if the entry is no longer waiting.
+        """
+        now = datetime.utcnow()
+        expires_at = now + self.hold
+        hold = {
+            "id": entry["id"],
+            "date": entry["date"],
+            "time": time,
+            "stylist_id": stylist["id"],
+            "total_duration": entry["duration"],
+        }
+        if not await claim_slots(hold, expires_at=expires_at + self.hold_grace):
+            return False
+        offer = {
+            "time": time,
+            "stylist_id": stylist["id"],
+            "stylist_name": stylist["name"],
+            "expires_at": expires_at,
+        }
+        updated = await self.collection.find_one_and_update(
+            {"id": entry["id"], "status": "waiting"},
+            {"$set": {"status": "offered", "offer": offer, "updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is None:
+            # Cancelled, or offered other time by a concurrent matcher
+            await release_slots(entry["id"], [claim["_id"] for claim in slot_claims(hold)])
+            return None
+        availability.occupy(entry["date"], stylist["id"], time, entry["duration"])
+        logger.info(f"Waitlist {entry['id']} offered {entry['date']} {time} with {stylist['name']}")
+        await queue_waitlist_offer(updated)
+        return True
+
+    async def release(self, entry):
+        """Free a lapsed or declined offer's hold and pass the time on"""
+        offer = entry["offer"]
+        await release_slots(entry["id"])
+        availability.release(entry["date"], offer["stylist_id"], offer["time"], entry["duration"])
+        await self.match(entry["date"], offer["stylist_id"])
+
+    async def expire_offers(self):
+        """Expire every offer past its hold; returns how many expired"""
+        expired = 0
+        while True:
+            entry = await self.collection.find_one_and_update(
+                {"status": "offered", "offer.expires_at": {"$lte": datetime.utcnow()}},
+                {"$set": {"status": "expired", "updated_at": datetime.utcnow()}}
+            )
+            if entry is None:
+                return expired
+            expired += 1
+            await self.release(entry)
+
+    async def slots_freed(self, date, stylist_id):
+        """Hook for cancellations and reschedules; never fails the calling request"""
+        try:
+            await self.match(date, stylist_id)
+        except Exception as e:
+            logger.error(f"Error matching waitlist for {date} / {stylist_id}: {str(e)}")
+
+
+async def queue_waitlist_offer(entry):
+    """Email a waitlisted client about the time being held for them"""
+    offer = entry["offer"]
+    try:
+        await db.outbox.insert_one({
+            "_id": f"{entry['id']}|offer|{offer['stylist_id']}|{offer['time']}",
+            "kind": "waitlist_offer",
+            "booking_id": entry["id"],
+            "to": entry["client"]["email"],
+            "payload": {
+                "reference": entry["id"],
+                "client_name": f"{entry['client']['first_name']} {entry['client']['last_name']}",
+                "date": entry["date"],
+                "time": offer["time"],
+                "stylist_name": offer["stylist_name"],
+                "services": service_summary(entry),
+                "expires_at": f"{offer['expires_at'].replace(tzinfo=timezone.utc).astimezone(SALON_TIMEZONE):%I:%M %p}".lstrip("0"),
+            },
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": datetime.utcnow(),
+            "created_at": datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        pass
+    except Exception as e:
+        logger.error(f"Failed to queue waitlist offer for {entry['id']}: {str(e)}")
+
+
+waitlist = WaitlistMatcher(
+    db.waitlist,
+    hold_minutes=int(os.environ.get('WAITLIST_HOLD_MINUTES', '15')),
+    sweep_interval=float(os.environ.get('WAITLIST_SWEEP_INTERVAL', '15'))
+)
+
+
+# ==================== Rate Limiting ====================
+
+class MemoryRateLimiter:
+    """In-process token buckets: `burst` requests at once, refilled at `per_minute`"""
+
+    def __init__(self, per_minute, burst, max_keys=100000):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    async def allow(self, key):
+        now = monotonic()
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed
+
+
+class MongoRateLimiter:
+    """Per-minute counters in Mongo, shared by every worker.
+
+    Uses fixed one-minute windows (one atomic $inc per request) rather than
+    token buckets; old windows are removed by a TTL index on expires_at.
+    """
+
+    def __init__(self, collection, per_minute, burst=None):
+        self.collection = collection
+        self.per_minute = per_minute
+
+    async def allow(self, key):
+        now = datetime.utcnow()
+        counter = await self.collection.find_one_and_update(
+            {"_id": f"{key}|{now:%Y%m%d%H%M}"},
+            {"$inc": {"count": 1}, "$setOnInsert": {"expires_at": now + timedelta(minutes=2)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["count"] <= self.per_minute
+
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+# Reverse proxies in front of the app (the platform ingress is one); 0 when serving clients directly
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '1'))
+
+
+def make_rate_limiter(per_minute, burst):
+    if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == 'mongo':
+        return MongoRateLimiter(db.rate_limits, per_minute, burst)
+    return MemoryRateLimiter(per_minute, burst)
+
+
+ip_rate_limiter = make_rate_limiter(
+    int(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', '30')),
+    int(os.environ.get('RATE_LIMIT_IP_BURST', '20'))
+)
+email_rate_limiter = make_rate_limiter(
+    int(os.environ.get('RATE_LIMIT_EMAIL_PER_MINUTE', '6')),
+    int(os.environ.get('RATE_LIMIT_EMAIL_BURST', '3'))
+)
+
+
+def client_ip(request):
+    """The client's address as seen by the outermost trusted proxy.
+
+    Each proxy appends the address it received the request from to
+    X-Forwarded-For, so with N trusted proxies the Nth entry from the right
+    is the client; entries further left are client-supplied and ignored.
+    """
+    if RATE_LIMIT_PROXY_HOPS:
+        forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+async def enforce_rate_limit(request, email, scope):
+    """Raise 429 when the client's IP or email has used up its allowance for `scope`"""
+    if not RATE_LIMIT_ENABLED:
+        return
+    ip = client_ip(request)
+    if not await ip_rate_limiter.allow(f"{scope}:ip:{ip}") \
+            or not await email_rate_limiter.allow(f"{scope}:email:{email.lower()}"):
+        logger.info(f"Rate limited {scope} from {ip} / {email}")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please try again shortly",
+            headers={"Retry-After": "60"}
+        )
+
+
+# ==================== Idempotency ====================
+
+class IdempotencyCache:
+    """Bounded LRU of recent write results keyed by idempotency key or payload hash.
+
+    A repeat of a request within `ttl` seconds gets the original response; a
+    repeat that arrives while the first is still running waits for it. Reusing
+    a key for a request with a different `fingerprint` is rejected with 422.
+    Failed requests are not remembered, so they can be retried.
+    """
+
+    def __init__(self, ttl=600.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (created_at, future, fingerprint)
+
+    async def run(self, key, fingerprint, create):
+        entry = self._entries.get(key)
+        if entry and monotonic() - entry[0] < self.ttl:
+            if entry[2] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            self._entries.move_to_end(key)
+            return await asyncio.shield(entry[1])
+        future = asyncio.ensure_future(create())
+        self._entries[key] = (monotonic(), future, fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if self._entries.get(key, (None, None, None))[1] is future:
+                del self._entries[key]
+            raise
+
+
+def request_fingerprint(payload):
+    """Hash of a request body, independent of field order"""
+    body = json.dumps(payload.dict(), sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def idempotency_key(scope, header_key, fingerprint):
+    """Cache key from the Idempotency-Key header, or the request body's fingerprint"""
+    if header_key:
+        return f"{scope}:key:{header_key}"
+    return f"{scope}:body:{fingerprint}"
+
+
+idempotency_cache = IdempotencyCache(ttl=float(os.environ.get('IDEMPOTENCY_TTL', '600')))
+
+
+# ==================== Routes ====================
+
+@api_router.get("/")
+async def root():
+    return {"message": "Luna Hair Salon API", "status": "running"}
+
+
+# --- Services Routes ---
+
+@api_router.get("/services")
+async def get_services(request: Request):
+    """Get all services with categories"""
+    return catalog.snapshot.services_response.response(request)
+
+
+# --- Stylists Routes ---
+
+@api_router.get("/stylists")
+async def get_stylists(request: Request):
+    """Get available stylists"""
+    return catalog.snapshot.stylists_response.response(request)
+
+
+# --- Time Slots Routes ---
+
+@api_router.get("/timeslots")
+async def get_time_slots(date: str, stylist_id: Optional[int] = None, duration: Optional[int] = None):
+    """Get start times on a date that fit a service of `duration` minutes"""
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    starts = await availability.start_mask(date, stylist_id, duration)
+    available_slots = slots_from_mask(starts)
+
+    return {
+        "date": date,
+        "stylist_id": stylist_id,
+        "available_slots": available_slots
+    }
+
+
+MAX_RANGE_DAYS = 62
+STATS_MAX_RANGE_DAYS = 366
+
+
+@api_router.get("/timeslots/range")
+async def get_time_slots_range(
+    start: str,
+    end: str,
+    stylist_id: Optional[int] = None,
+    duration: Optional[int] = None
+):
+    """Get available start times for every date in [start, end] in one call.
+
+    Each day is a bitmask over `slots`: bit i set means slots[i] is available.
+    """
+    try:
+        first = datetime.strptime(start, "%Y-%m-%d").date()
+        last = datetime.strptime(end, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if last < first or (last - first).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must span 1 to {MAX_RANGE_DAYS} days")
+
+    dates = [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+    occupancy = await availability.days(dates)
+    days = {date: day_start_mask(occupancy[date], stylist_id, duration) for date in dates}
+
+    return {
+        "start": start,
+        "end": end,
+        "stylist_id": stylist_id,
+        "slots": catalog.snapshot.time_slots,
+        "days": days,
+        "fully_booked": [date for date, starts in days.items() if not starts]
+    }
+
+
+@api_router.get("/timeslots/stream")
+async def stream_time_slots(date: str, stylist_id: Optional[int] = None, duration: Optional[int] = None):
+    """Server-sent events with the live start times for a date and stylist.
+
+    Sends a `snapshot` event, then `slots_taken` / `slots_freed` as bookings
+    change, each with the updated `available_slots`.
+    """
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    # Subscribe before the snapshot so no change in between is missed
+    queue = availability_hub.subscribe(date, stylist_id, duration)
+
+    async def events():
+        try:
+            starts = await availability.start_mask(date, stylist_id, duration)
+            snapshot = {"date": date, "stylist_id": stylist_id, "available_slots": slots_from_mask(starts)}
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            availability_hub.unsubscribe(date, stylist_id, duration, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# --- Booking Routes ---
+
+@api_router.post("/bookings", response_model=dict, status_code=201)
+async def create_booking(
+    booking_data: BookingCreate,
+    request: Request,
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Create a new booking appointment with single or multiple services"""
+    async def create():
+        # Replays of a recent request are answered from the cache without using up the rate limit
+        await enforce_rate_limit(request, booking_data.client.email, "bookings")
+        return await save_booking(booking_data)
+
+    fingerprint = request_fingerprint(booking_data)
+    return await idempotency_cache.run(idempotency_key("bookings", idempotency_key_header, fingerprint), fingerprint, create)
+
+
+def build_booking(booking_data, reference, snapshot):
+    """Booking for a request; names, prices and durations come from the catalog, not the client"""
+    stylist = snapshot.resolve_stylist(booking_data.stylist_id)
+
+    # Handle multiple services
+    if booking_data.services and len(booking_data.services) > 0:
+        services_list, total_duration, total_price = snapshot.quote(booking_data.services)
+        return Booking(
+            reference=reference,
+            services=services_list,
+            total_duration=total_duration,
+            total_price_min=price_label(total_price),
+            date=booking_data.date,
+            time=booking_data.time,
+            stylist_id=stylist["id"],
+            stylist_name=stylist["name"],
+            client_first_name=booking_data.client.first_name,
+            client_last_name=booking_data.client.last_name,
+            client_email=booking_data.client.email,
+            client_phone=booking_data.client.phone,
+            client_notes=booking_data.client.notes or ""
+        )
+
+    # Legacy single service booking
+    service = snapshot.resolve_service(booking_data.service_category, booking_data.service_name)
+    return Booking(
+        reference=reference,
+        service_category=service["category"],
+        service_name=service["name"],
+        service_price=service["price"],
+        service_duration=service["duration"],
+        date=booking_data.date,
+        time=booking_data.time,
+        stylist_id=stylist["id"],
+        stylist_name=stylist["name"],
+        client_first_name=booking_data.client.first_name,
+        client_last_name=booking_data.client.last_name,
+        client_email=booking_data.client.email,
+        client_phone=booking_data.client.phone,
+        client_notes=booking_data.client.notes or ""
+    )
+
+
+def booking_document(booking):
+    """Mongo document for a new booking with its UTC appointment window; 400 on a bad date or time"""
+    booking_dict = booking.dict()
+    booking_dict["created_at"] = datetime.utcnow()
+    if booking_dict["series_id"] is None:
+        # Keeps one-off bookings out of the partial series index
+        del booking_dict["series_id"]
+
+    if booking.time not in catalog.snapshot.slot_index:
+        raise HTTPException(status_code=400, detail="Invalid time slot")
+    try:
+        booking_dict["start_at"], booking_dict["end_at"] = appointment_window(
+            booking.date, booking.time, booking_duration(booking_dict)
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    return booking_dict
+
+
+def created_response(booking):
+    """API response for a newly created booking"""
+    response = {
+        "id": booking.id,
+        "reference": booking.reference,
+        "status": "confirmed",
+        "date": booking.date,
+        "time": booking.time,
+        "stylist_id": booking.stylist_id,
+        "stylist_name": booking.stylist_name,
+        "client_name": f"{booking.client_first_name} {booking.client_last_name}",
+        "client_email": booking.client_email,
+        "created_at": booking.created_at.isoformat()
+    }
+
+    # Return appropriate response based on booking type
+    if booking.services:
+        response["services"] = booking.services
+        response["total_duration"] = booking.total_duration
+        response["total_price_min"] = booking.total_price_min
+    else:
+        response["service_category"] = booking.service_category
+        response["service_name"] = booking.service_name
+        response["service_price"] = booking.service_price
+        response["service_duration"] = booking.service_duration
+    if booking.series_id:
+        response["series_id"] = booking.series_id
+    return response
+
+
+async def booking_created(booking_dict, confirm=True):
+    """Bookkeeping after a booking is stored: availability, stats, client index, emails"""
+    availability.occupy(
+        booking_dict["date"], booking_dict["stylist_id"], booking_dict["time"], booking_duration(booking_dict)
+    )
+    await record_booking_stats(booking_dict)
+    await record_client_booking(booking_dict)
+    await queue_booking_notifications(booking_dict, confirm)
+
+
+async def save_booking(booking_data: BookingCreate, booking_id=None, held=()):
+    """Validate, reserve and store a booking; returns the API response.
+
+    `booking_id` and `held` take over slot claims already held for the
+    booking (a waitlist offer being accepted).
+    """
+    try:
+        reference = await generate_reference()
+        booking = build_booking(booking_data, reference, catalog.snapshot)
+        if booking_id:
+            booking.id = booking_id
+        booking_dict = booking_document(booking)
+
+        if booking.stylist_id == ANY_STYLIST_ID:
+            claimed = await assign_stylist(booking_dict)
+            booking.stylist_id = booking_dict["stylist_id"]
+            booking.stylist_name = booking_dict["stylist_name"]
+        else:
+            span = slot_mask(booking.time, booking_duration(booking_dict))
+            # Slots this booking already holds (an accepted waitlist offer) do not block it
+            if held:
+                span &= ~held_mask(booking.date, booking.stylist_id, held)
+            occupied = await availability.occupied(booking.date, booking.stylist_id)
+            if occupied & span:
+                # The cache may predate a cancellation made through another worker;
+                # the slot claims stay the authoritative check
+                occupied = (await availability.reloaded(booking.date)).get(booking.stylist_id, 0)
+            claimed = not occupied & span and await claim_slots(booking_dict, held=held)
+        if not claimed:
+            raise HTTPException(status_code=409, detail="Time slot is no longer available")
+
+        for _ in range(3):
+            try:
+                await db.bookings.insert_one(booking_dict)
+                break
+            except DuplicateKeyError:
+                # Clashes with a reference issued by the old timestamp scheme
+                reference = booking.reference = booking_dict["reference"] = await generate_reference()
+            except Exception:
+                await release_slots(booking.id)
+                raise
+        else:
+            await release_slots(booking.id)
+            raise RuntimeError("Could not allocate a unique booking reference")
+        await booking_created(booking_dict)
+        
+        logger.info(f"Booking created: {reference} for {booking_data.client.email}")
+        return created_response(booking)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating booking: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to create booking")
+
+
+@api_router.get("/bookings", response_model=dict)
+async def get_bookings(
+    limit: int = Query(50, ge=1, le=500),
+    after: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    stylist_id: Optional[int] = None,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None
+):
+    """Get one page of bookings, newest first (admin use)"""
+    bookings, next_cursor = await fetch_page(
+        db.bookings,
+        booking_query(date_from, date_to, stylist_id, status),
+        limit,
+        after,
+        build_projection(fields, exclude)
+    )
+    return json_response({"bookings": bookings, "next_cursor": next_cursor})
+
+
+@api_router.get("/bookings/export")
+async def export_bookings(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(500, ge=1, le=5000),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    stylist_id: Optional[int] = None,
+    status: Optional[str] = None
+):
+    """Stream all matching bookings as NDJSON or CSV (admin reporting)"""
+    return export_response(
+        db.bookings,
+        booking_query(date_from, date_to, stylist_id, status),
+        format,
+        BOOKING_EXPORT_FIELDS,
+        batch_size,
+        "bookings"
+    )
+
+
+@api_router.get("/bookings/{reference}", response_model=dict)
+async def get_booking_by_reference(reference: str):
+    """Get booking by reference number"""
+    booking = await db.bookings.find_one({"reference": reference})
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    if not FAST_JSON:
+        prepare_documents([booking])
+    return json_response(booking)
+
+
+# --- Metrics Routes ---
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Request and database metrics in Prometheus text format"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# --- Booking Lifecycle Routes ---
+
+async def end_booking(reference, status):
+    """Move an active booking to `status` and free its time"""
+    booking = await db.bookings.find_one_and_update(
+        {"reference": reference, "status": ACTIVE_STATUS},
+        {"$set": {"status": status, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if booking is None:
+        if await db.bookings.count_documents({"reference": reference}, limit=1):
+            raise HTTPException(status_code=409, detail="Booking is no longer active")
+        raise HTTPException(status_code=404, detail="Booking not found")
+
+    await release_slots(booking["id"])
+    availability.release(booking["date"], booking["stylist_id"], booking["time"], booking_duration(booking))
+    if status == "cancelled":
+        await record_booking_stats(booking, sign=-1, cancelled=True)
+        await waitlist.slots_freed(booking["date"], booking["stylist_id"])
+    await cancel_booking_notifications(booking)
+    logger.info(f"Booking {reference} marked {status}")
+    return booking
+
+
+def booking_response(booking):
+    if not FAST_JSON:
+        prepare_documents([booking])
+    return json_response(booking)
+
+
+@api_router.post("/bookings/{reference}/cancel", response_model=dict)
+async def cancel_booking(reference: str):
+    """Cancel a booking and free its time slots"""
+    return booking_response(await end_booking(reference, "cancelled"))
+
+
+@api_router.post("/bookings/{reference}/complete", response_model=dict)
+async def complete_booking(reference: str):
+    """Mark a booking as completed"""
+    return booking_response(await end_booking(reference, "completed"))
+
+
+@api_router.post("/bookings/{reference}/reschedule", response_model=dict)
+async def reschedule_booking(reference: str, change: BookingReschedule):
+    """Move an active booking to a new date, time and optionally stylist"""
+    booking = await db.bookings.find_one({"reference": reference})
+    if booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return booking_response(await move_booking(booking, change))
+
+
+async def move_booking(booking, change):
+    """Move a stored booking to `change`'s date, time and stylist; returns the updated document"""
+    if booking["status"] != ACTIVE_STATUS:
+        raise HTTPException(status_code=409, detail="Booking is no longer active")
+    if change.time not in catalog.snapshot.slot_index:
+        raise HTTPException(status_code=400, detail="Invalid time slot")
+    try:
+        appointment_window(change.date, change.time, booking_duration(booking))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+
+    old_claims = {claim["_id"] for claim in slot_claims(booking)}
+    moved = {**booking, "date": change.date, "time": change.time}
+    if change.stylist_id is not None and change.stylist_id != ANY_STYLIST_ID:
+        stylist = catalog.snapshot.resolve_stylist(change.stylist_id)
+        moved["stylist_id"] = stylist["id"]
+        moved["stylist_name"] = stylist["name"]
+
+    if change.stylist_id == ANY_STYLIST_ID:
+        claimed = await assign_stylist(moved, current=booking, held=old_claims)
+    else:
+        occupied = await availability.occupied(moved["date"], moved["stylist_id"])
+        if moved["date"] == booking["date"] and moved["stylist_id"] == booking["stylist_id"]:
+            # The booking's own current slots do not block its new ones
+            occupied &= ~slot_mask(booking["time"], booking_duration(booking))
+        claimed = not occupied & slot_mask(moved["time"], booking_duration(moved)) \
+            and await claim_slots(moved, held=old_claims)
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Time slot is no longer available")
+
+    new_claims = {claim["_id"] for claim in slot_claims(moved)}
+    updated = await update_moved_booking(booking, moved)
+    if updated is None:
+        # Changed concurrently; give back only the slots claimed for the move
+        await release_slots(booking["id"], new_claims - old_claims)
+        raise HTTPException(status_code=409, detail="Booking was changed by another request")
+
+    await release_slots(booking["id"], old_claims - new_claims)
+    duration = booking_duration(booking)
+    availability.release(booking["date"], booking["stylist_id"], booking["time"], duration)
+    availability.occupy(updated["date"], updated["stylist_id"], updated["time"], duration)
+    await booking_moved(booking, updated)
+    return updated
+
+
+async def update_moved_booking(booking, moved):
+    """Store `moved`'s date, time and stylist if `booking` is unchanged since it was read; None otherwise"""
+    start_at, end_at = appointment_window(moved["date"], moved["time"], booking_duration(booking))
+    return await db.bookings.find_one_and_update(
+        {
+            "_id": booking["_id"],
+            "status": ACTIVE_STATUS,
+            "date": booking["date"],
+            "time": booking["time"],
+            "stylist_id": booking["stylist_id"],
+        },
+        {"$set": {
+            "date": moved["date"],
+            "time": moved["time"],
+            "stylist_id": moved["stylist_id"],
+            "stylist_name": moved["stylist_name"],
+            "start_at": start_at,
+            "end_at": end_at,
+            "updated_at": datetime.utcnow(),
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def booking_moved(booking, updated):
+    """Bookkeeping after a booking moved: stats, waitlist, notifications"""
+    if (updated["date"], updated["stylist_id"]) != (booking["date"], booking["stylist_id"]):
+        await record_booking_stats(booking, sign=-1)
+        await record_booking_stats(updated)
+    await waitlist.slots_freed(booking["date"], booking["stylist_id"])
+    await reschedule_booking_notifications(updated)
+    logger.info(f"Booking {booking['reference']} rescheduled to {updated['date']} {updated['time']}")
+
+
+# --- Booking Series Routes ---
+
+def series_conflict(dates):
+    return HTTPException(
+        status_code=409,
+        detail={"message": "Some occurrences are not available", "conflicting_dates": dates}
+    )
+
+
+def parse_date(date):
+    try:
+        return datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+
+
+@api_router.post("/bookings/series", response_model=dict, status_code=201)
+async def create_booking_series(series_data: BookingSeriesCreate, request: Request):
+    """Book the same service, time and stylist every `interval_weeks`, all or nothing.
+
+    Availability of every occurrence is checked from one occupancy load, the
+    slots of all occurrences are claimed in one insert_many and the bookings
+    are stored with another. If any occurrence clashes nothing is booked and
+    the 409 lists the conflicting dates.
+    """
+    await enforce_rate_limit(request, series_data.client.email, "bookings")
+    if series_data.stylist_id == ANY_STYLIST_ID:
+        raise HTTPException(status_code=400, detail="Recurring bookings need a specific stylist")
+    first = parse_date(series_data.start_date)
+    dates = [
+        (first + timedelta(weeks=series_data.interval_weeks * i)).isoformat()
+        for i in range(series_data.count)
+    ]
+
+    snapshot = catalog.snapshot
+    series_id = str(uuid.uuid4())
+    fields = series_data.dict(exclude={"start_date", "interval_weeks", "count"})
+    bookings = []
+    for date in dates:
+        booking = build_booking(BookingCreate(**fields, date=date), await generate_reference(), snapshot)
+        booking.series_id = series_id
+        bookings.append(booking)
+    documents = [booking_document(booking) for booking in bookings]
+
+    stylist_id = bookings[0].stylist_id
+    span = slot_mask(series_data.time, booking_duration(documents[0]))
+    occupancy = await availability.days(dates)
+    conflicts = [date for date in dates if real_stylist_masks(occupancy[date]).get(stylist_id, 0) & span]
+    if conflicts:
+        raise series_conflict(conflicts)
+    conflicts = await claim_many(documents)
+    if conflicts:
+        raise series_conflict(conflicts)
+
+    try:
+        await db.bookings.insert_many(documents, ordered=True)
+    except Exception as e:
+        await db.bookings.delete_many({"series_id": series_id})
+        await db.slot_claims.delete_many({"booking_id": {"$in": [doc["id"] for doc in documents]}})
+        logger.error(f"Error creating booking series: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to create booking series")
+
+    for i, document in enumerate(documents):
+        # One confirmation for the series; every occurrence gets its reminder
+        await booking_created(document, confirm=i == 0)
+    logger.info(f"Booking series {series_id} created: {len(documents)} occurrences for {series_data.client.email}")
+    return {"series_id": series_id, "bookings": [created_response(booking) for booking in bookings]}
+
+
+async def series_occurrences(series_id, from_date=None, active_only=False):
+    """Bookings of a series in appointment order; 404 if the series does not exist"""
+    query = {"series_id": series_id}
+    if from_date:
+        parse_date(from_date)
+        query["date"] = {"$gte": from_date}
+    if active_only:
+        query["status"] = ACTIVE_STATUS
+    bookings = await db.bookings.find(query).sort("start_at", ASCENDING).to_list(None)
+    if not bookings and not await db.bookings.count_documents({"series_id": series_id}, limit=1):
+        raise HTTPException(status_code=404, detail="Booking series not found")
+    return bookings
+
+
+@api_router.get("/bookings/series/{series_id}", response_model=dict)
+async def get_booking_series(series_id: str):
+    """Every occurrence of a recurring booking, in appointment order"""
+    bookings = await series_occurrences(series_id)
+    if not FAST_JSON:
+        prepare_documents(bookings)
+    return json_response({"series_id": series_id, "bookings": bookings})
+
+
+@api_router.post("/bookings/series/{series_id}/cancel", response_model=dict)
+async def cancel_booking_series(series_id: str, from_date: Optional[str] = None):
+    """Cancel every active occurrence (on or after `from_date`) of a series"""
+    cancelled = []
+    for booking in await series_occurrences(series_id, from_date, active_only=True):
+        try:
+            cancelled.append((await end_booking(booking["reference"], "cancelled"))["reference"])
+        except HTTPException as e:
+            if e.status_code != 409:  # already cancelled or completed meanwhile
+                raise
+    return {"series_id": series_id, "cancelled": cancelled}
+
+
+@api_router.post("/bookings/series/{series_id}/reschedule", response_model=dict)
+async def reschedule_booking_series(series_id: str, change: BookingSeriesReschedule):
+    """Move every active occurrence (on or after `from_date`) to a new time, stylist or date offset.
+
+    All or nothing: targets are checked against one occupancy load, then the
+    new slots of every occurrence are claimed together before any booking
+    changes. An occurrence's target may be a slot the series already holds
+    (e.g. `shift_days` equal to the interval); those claims are handed over
+    rather than claimed again. Any clash rejects the change with the
+    conflicting dates and leaves the series as it was.
+    """
+    if change.stylist_id == ANY_STYLIST_ID:
+        raise HTTPException(status_code=400, detail="Recurring bookings need a specific stylist")
+    stylist = catalog.snapshot.resolve_stylist(change.stylist_id) if change.stylist_id is not None else None
+    if change.time is not None and change.time not in catalog.snapshot.slot_index:
+        raise HTTPException(status_code=400, detail="Invalid time slot")
+    bookings = await series_occurrences(series_id, change.from_date, active_only=True)
+
+    moves = []
+    for booking in bookings:
+        moved = {
+            **booking,
+            "date": (parse_date(booking["date"]) + timedelta(days=change.shift_days)).isoformat(),
+            "time": change.time or booking["time"],
+        }
+        if stylist is not None:
+            moved["stylist_id"] = stylist["id"]
+            moved["stylist_name"] = stylist["name"]
+        moves.append((booking, moved))
+
+    occupancy = await availability.days(sorted({moved["date"] for _, moved in moves} | {b["date"] for b in bookings}))
+    masks = {date: real_stylist_masks(day) for date, day in occupancy.items()}
+    # The occurrences being moved do not block each other's new times
+    for booking in bookings:
+        stylist_masks = masks[booking["date"]]
+        if booking["stylist_id"] in stylist_masks:
+            stylist_masks[booking["stylist_id"]] &= ~slot_mask(booking["time"], booking_duration(booking))
+    conflicts = [
+        moved["date"] for booking, moved in moves
+        if masks[moved["date"]].get(moved["stylist_id"], 0) & slot_mask(moved["time"], booking_duration(booking))
+    ]
+    if conflicts:
+        raise series_conflict(conflicts)
+
+    # Claim id -> occurrence id, before and after the move
+    current = {claim["_id"]: booking["id"] for booking in bookings for claim in slot_claims(booking)}
+    targets = {claim["_id"]: moved["id"] for _, moved in moves for claim in slot_claims(moved)}
+    conflicts = await claim_many([moved for _, moved in moves], held=current)
+    if conflicts:
+        raise series_conflict(conflicts)
+    handed_over = [claim_id for claim_id in targets if claim_id in current and current[claim_id] != targets[claim_id]]
+
+    async def hand_over(owners):
+        if handed_over:
+            await db.slot_claims.bulk_write(
+                [UpdateOne({"_id": claim_id}, {"$set": {"booking_id": owners[claim_id]}}) for claim_id in handed_over],
+                ordered=False
+            )
+
+    await hand_over(targets)
+    updated = []
+    for booking, moved in moves:
+        document = await update_moved_booking(booking, moved)
+        if document is None:
+            # Changed by another request meanwhile: put everything back
+            for original, moved_back in moves[:len(updated)]:
+                await update_moved_booking(moved_back, original)
+            await hand_over(current)
+            await db.slot_claims.delete_many({"_id": {"$in": [claim_id for claim_id in targets if claim_id not in current]}})
+            raise HTTPException(status_code=409, detail="Booking was changed by another request")
+        updated.append(document)
+    await db.slot_claims.delete_many({"_id": {"$in": [claim_id for claim_id in current if claim_id not in targets]}})
+
+    # Release every old span before occupying the new ones, as they may overlap
+    for booking in bookings:
+        availability.release(booking["date"], booking["stylist_id"], booking["time"], booking_duration(booking))
+    for document in updated:
+        availability.occupy(document["date"], document["stylist_id"], document["time"], booking_duration(document))
+    for (booking, _), document in zip(moves, updated):
+        await booking_moved(booking, document)
+    if not FAST_JSON:
+        prepare_documents(updated)
+    return json_response({"series_id": series_id, "rescheduled": updated})
+
+
+# --- Waitlist Routes ---
+
+@api_router.post("/waitlist", response_model=dict, status_code=201)
+async def join_waitlist(entry_data: WaitlistCreate, request: Request):
+    """Wait for time with a stylist on a fully booked date; an offer may be made right away"""
+    await enforce_rate_limit(request, entry_data.client.email, "waitlist")
+    snapshot = catalog.snapshot
+    try:
+        datetime.strptime(entry_data.date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    first = snapshot.slot_index.get(entry_data.earliest_time)
+    last = snapshot.slot_index.get(entry_data.latest_time)
+    if first is None or last is None or last < first:
+        raise HTTPException(status_code=400, detail="Invalid time window")
+    stylist = snapshot.resolve_stylist(entry_data.stylist_id)
+
+    entry = {
+        "id": str(uuid.uuid4()),
+        "status": "waiting",
+        "date": entry_data.date,
+        "earliest_time": entry_data.earliest_time,
+        "latest_time": entry_data.latest_time,
+        "stylist_id": stylist["id"],
+        "client": entry_data.client.dict(),
+        "created_at": datetime.utcnow(),
+    }
+    if entry_data.services:
+        entry["services"], entry["duration"], _ = snapshot.quote(entry_data.services)
+    else:
+        service = snapshot.resolve_service(entry_data.service_category, entry_data.service_name)
+        entry["service_category"] = service["category"]
+        entry["service_name"] = service["name"]
+        entry["duration"] = service["duration"]
+    await db.waitlist.insert_one(entry)
+    logger.info(f"Waitlist {entry['id']} joined for {entry['date']} with stylist {entry['stylist_id']}")
+
+    # The window may already have room, e.g. after a cancellation nobody was waiting for
+    stylist_ids = [entry["stylist_id"]] if entry["stylist_id"] != ANY_STYLIST_ID \
+        else [stylist["id"] for stylist in snapshot.real_stylists]
+    for stylist_id in stylist_ids:
+        await waitlist.slots_freed(entry["date"], stylist_id)
+    return json_response(await find_waitlist_entry(entry["id"]), status_code=201)
+
+
+async def find_waitlist_entry(entry_id):
+    """A waitlist entry without its Mongo _id; 404 if there is none"""
+    entry = await db.waitlist.find_one({"id": entry_id}, {"_id": 0})
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Waitlist entry not found")
+    return entry
+
+
+@api_router.get("/waitlist/{entry_id}", response_model=dict)
+async def get_waitlist_entry(entry_id: str):
+    """A waitlist entry with its status and any offer being held"""
+    return json_response(await find_waitlist_entry(entry_id))
+
+
+@api_router.post("/waitlist/{entry_id}/accept", response_model=dict, status_code=201)
+async def accept_waitlist_offer(entry_id: str):
+    """Turn a held offer into a confirmed booking"""
+    entry = await db.waitlist.find_one_and_update(
+        {"id": entry_id, "status": "offered", "offer.expires_at": {"$gt": datetime.utcnow()}},
+        {"$set": {"status": "accepting", "updated_at": datetime.utcnow()}}
+    )
+    if entry is None:
+        if await db.waitlist.count_documents({"id": entry_id}, limit=1):
+            raise HTTPException(status_code=409, detail="No offer is being held for this entry")
+        raise HTTPException(status_code=404, detail="Waitlist entry not found")
+
+    offer = entry["offer"]
+    # From here on the hold belongs to a booking and must not expire
+    await db.slot_claims.update_many({"booking_id": entry_id}, {"$unset": {"expires_at": ""}})
+    held = {claim["_id"] for claim in await db.slot_claims.find({"booking_id": entry_id}, {"_id": 1}).to_list(None)}
+    booking_data = BookingCreate(
+        service_category=entry.get("service_category"),
+        service_name=entry.get("service_name"),
+        services=entry.get("services"),
+        date=entry["date"],
+        time=offer["time"],
+        stylist_id=offer["stylist_id"],
+        stylist_name=offer["stylist_name"],
+        client=entry["client"],
+    )
+    try:
+        response = await save_booking(booking_data, booking_id=entry_id, held=held)
+    except HTTPException:
+        await db.waitlist.update_one(
+            {"id": entry_id}, {"$set": {"status": "expired", "updated_at": datetime.utcnow()}}
+        )
+        await waitlist.release(entry)
+        raise
+    await db.waitlist.update_one(
+        {"id": entry_id},
+        {"$set": {"status": "booked", "booking_reference": response["reference"], "updated_at": datetime.utcnow()}}
+    )
+    return response
+
+
+@api_router.post("/waitlist/{entry_id}/cancel", response_model=dict)
+async def leave_waitlist(entry_id: str):
+    """Leave the waitlist, declining any offer being held"""
+    entry = await db.waitlist.find_one_and_update(
+        {"id": entry_id, "status": {"$in": ["waiting", "offered"]}},
+        {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}}
+    )
+    if entry is None:
+        if await db.waitlist.count_documents({"id": entry_id}, limit=1):
+            raise HTTPException(status_code=409, detail="Waitlist entry is no longer active")
+        raise HTTPException(status_code=404, detail="Waitlist entry not found")
+    if entry["status"] == "offered":
+        await waitlist.release(entry)
+    return await get_waitlist_entry(entry_id)
+
+
+# --- Contact Routes ---
+
+@api_router.post("/contact", response_model=dict, status_code=201)
+async def create_contact(
+    contact_data: ContactCreate,
+    request: Request,
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Submit a contact form inquiry"""
+    async def create():
+        # Replays of a recent request are answered from the cache without using up the rate limit
+        await enforce_rate_limit(request, contact_data.email, "contact")
+        return await save_contact(contact_data)
+
+    fingerprint = request_fingerprint(contact_data)
+    return await idempotency_cache.run(idempotency_key("contact", idempotency_key_header, fingerprint), fingerprint, create)
+
+
+async def save_contact(contact_data: ContactCreate):
+    """Store a contact form submission; returns the API response"""
+    try:
+        contact = Contact(
+            first_name=contact_data.first_name,
+            last_name=contact_data.last_name,
+            email=contact_data.email,
+            subject=contact_data.subject,
+            message=contact_data.message
+        )
+        
+        contact_dict = contact.dict()
+        contact_dict["created_at"] = datetime.utcnow()
+        
+        if contact_writer.running:
+            try:
+                await contact_writer.put(contact_dict)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=503, detail="Too many submissions, please try again shortly")
+        else:
+            await db.contact_submissions.insert_one(contact_dict)
+        
+        logger.info(f"Contact form submitted by {contact_data.email}")
+        
+        return {
+            "id": contact.id,
+            "status": "received",
+            "message": "Thank you for your message. We'll get back to you soon.",
+            "created_at": contact.created_at.isoformat()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting contact form: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to submit contact form")
+
+
+@api_router.get("/contact", response_model=dict)
+async def get_contact_submissions(
+    limit: int = Query(50, ge=1, le=500),
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None
+):
+    """Get one page of contact submissions, newest first (admin use)"""
+    query = {"status": status} if status else {}
+    contacts, next_cursor = await fetch_page(
+        db.contact_submissions, query, limit, after, build_projection(fields, exclude)
+    )
+    return json_response({"contacts": contacts, "next_cursor": next_cursor})
+
+
+@api_router.get("/contact/export")
+async def export_contact_submissions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(500, ge=1, le=5000),
+    status: Optional[str] = None
+):
+    """Stream all matching contact submissions as NDJSON or CSV (admin reporting)"""
+    return export_response(
+        db.contact_submissions,
+        {"status": status} if status else {},
+        format,
+        CONTACT_EXPORT_FIELDS,
+        batch_size,
+        "contact_submissions"
+    )
+
+
+# --- Client Routes ---
+
+@api_router.get("/clients", response_model=dict)
+async def find_clients(phone: str):
+    """Find clients by phone number (any formatting)"""
+    digits = normalize_phone(phone)
+    if not digits:
+        raise HTTPException(status_code=400, detail="Phone number must contain digits")
+    clients = await db.clients.find({"phone_digits": digits}).to_list(20)
+    return json_response({"clients": clients})
+
+
+@api_router.get("/clients/{email}/bookings", response_model=dict)
+async def get_client_bookings(email: str):
+    """A client's profile and most recent bookings, newest first (front-desk lookup)"""
+    client_doc = await db.clients.find_one({"_id": normalize_email(email)})
+    if client_doc is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+    bookings = await db.bookings.find(
+        {"reference": {"$in": client_doc["recent"]}}
+    ).to_list(len(client_doc["recent"]))
+    order = {reference: i for i, reference in enumerate(client_doc["recent"])}
+    bookings.sort(key=lambda booking: order[booking["reference"]])
+    if not FAST_JSON:
+        prepare_documents(bookings)
+    return json_response({
+        "client": {key: value for key, value in client_doc.items() if key != "recent"},
+        "bookings": bookings
+    })
+
+
+# --- Stats Routes ---
+
+@api_router.get("/stats", response_model=dict)
+async def get_stats(date_from: str, date_to: str, stylist_id: Optional[int] = None):
+    """Booking counts, booked minutes, minimum revenue and utilization for a date range.
+
+    Served from the pre-aggregated daily_stats rows; revenue is the sum of the
+    catalog's minimum prices ("$50+" counts as 50). Cancelled bookings are
+    only counted under `cancelled`.
+    """
+    try:
+        first = datetime.strptime(date_from, "%Y-%m-%d").date()
+        last = datetime.strptime(date_to, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if last < first or (last - first).days >= STATS_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must span 1 to {STATS_MAX_RANGE_DAYS} days")
+
+    query = {"date": {"$gte": date_from, "$lte": date_to}}
+    if stylist_id is not None:
+        query["stylist_id"] = stylist_id
+    rows = await db.daily_stats.find(query, {"_id": 0}).to_list(None)
+
+    days = [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+    stylists = 1 if stylist_id is not None else len(catalog.snapshot.real_stylists)
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "stylist_id": stylist_id,
+        **summarize_stats(rows, days, stylists * len(days))
+    }
+
+
+# Include the router in the main app
+app.include_router(api_router)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_credentials=True,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes(db)
+
+
+@app.on_event("startup")
+async def load_catalog():
+    await catalog.seed()
+    await catalog.load()
+    catalog.start()
+
+
+@app.on_event("startup")
+async def warm_up():
+    """Open database connections and fill read caches before taking traffic"""
+    started = perf_counter()
+    connections = int(os.environ.get('WARMUP_CONNECTIONS', os.environ.get('MONGO_MIN_POOL_SIZE') or '4'))
+    # Concurrent pings each check out their own pooled connection
+    await asyncio.gather(*(db.command("ping") for _ in range(connections)))
+    today = datetime.now(SALON_TIMEZONE).date()
+    days = int(os.environ.get('WARMUP_DAYS', '14'))
+    await availability.days([(today + timedelta(days=i)).isoformat() for i in range(days)])
+    logger.info(f"Warmed up {connections} connections and {days} days of availability "
+                f"in {(perf_counter() - started) * 1000:.0f} ms")
+
+
+@app.on_event("startup")
+async def start_waitlist_sweeper():
+    waitlist.start()
+
+
+@app.on_event("startup")
+async def start_claim_change_stream():
+    if LIVE_AVAILABILITY_SOURCE == "changestream":
+        claim_change_stream.start()
+
+
+@app.on_event("startup")
+async def start_contact_writer():
+    if CONTACT_WRITE_BEHIND:
+        contact_writer.start()
+
+
+@app.on_event("startup")
+async def start_notifier():
+    if notifier:
+        notifier.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    catalog.stop()
+    waitlist.stop()
+    claim_change_stream.stop()
+    await contact_writer.stop()
+    if notifier:
+        await notifier.stop()
     client.close()
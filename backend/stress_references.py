@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Luna Hair Salon booking reference stress test
+Spawns several worker processes that allocate references concurrently from the
+shared Mongo sequence and fails if any reference is issued twice. Run against a
+local mongod:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=luna_stress python stress_references.py
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+
+COUNTER_NAME = "stress_reference"
+
+
+def allocate_references(args):
+    """Worker process: allocate `count` references from `concurrency` tasks"""
+    count, concurrency, block_size = args
+    import server
+
+    async def run():
+        allocator = server.ReferenceAllocator(
+            server.db.counters, name=COUNTER_NAME, block_size=block_size
+        )
+
+        async def task(n):
+            return [await allocator.next() for _ in range(n)]
+
+        share, extra = divmod(count, concurrency)
+        batches = await asyncio.gather(
+            *(task(share + (1 if i < extra else 0)) for i in range(concurrency))
+        )
+        return [reference for batch in batches for reference in batch]
+
+    try:
+        return asyncio.run(run())
+    finally:
+        server.client.close()
+
+
+def stress_references(workers, count, concurrency, block_size):
+    import server
+
+    asyncio.run(server.db.counters.delete_one({"_id": COUNTER_NAME}))
+    server.client.close()
+
+    print(f"Allocating {workers} x {count} references "
+          f"({concurrency} tasks per worker, block size {block_size})")
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        results = pool.map(allocate_references, [(count, concurrency, block_size)] * workers)
+    elapsed = time.perf_counter() - started
+
+    references = [reference for result in results for reference in result]
+    duplicates = len(references) - len(set(references))
+    print(f"Allocated {len(references)} references in {elapsed:.2f}s "
+          f"({len(references) / elapsed:,.0f}/s)")
+
+    if duplicates:
+        print(f"❌ FAIL {duplicates} duplicate references")
+        return False
+    print("✅ PASS zero collisions")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--count", type=int, default=5000, help="references per worker")
+    parser.add_argument("--concurrency", type=int, default=50, help="async tasks per worker")
+    parser.add_argument("--block-size", type=int, default=20)
+    args = parser.parse_args()
+
+    success = stress_references(args.workers, args.count, args.concurrency, args.block_size)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+Luna Hair Salon Backend Benchmark Suite
+Drives realistic mixed traffic against the booking API and reports p50/p95/p99
+latency and throughput per route, optionally saving or comparing a baseline.
+
+    # In-process against a local mongod (or --mongomock for mongomock-motor)
+    python backend_benchmark.py load --fresh --requests 5000 --concurrency 100 --save baseline.json
+    python backend_benchmark.py load --fresh --baseline baseline.json
+
+    # Against a running server
+    python backend_benchmark.py load --url http://localhost:8001
+
+    # Throughput vs. uvicorn worker count (needs a real MONGO_URL)
+    python backend_benchmark.py scaling --workers 1,2,4,8
+
+    # Micro-benchmarks
+    python backend_benchmark.py serialization --bookings 1000
+    python backend_benchmark.py pricing --services 1,3,5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+
+def load_server(db_name, mongomock=False):
+    """Import backend/server.py against a benchmark database"""
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = db_name
+    # All benchmark traffic comes from one client address
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    if mongomock:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    return server
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+# ==================== Traffic Mix ====================
+
+class Traffic:
+    """Generates the requests of a realistic salon workload"""
+
+    def __init__(self, services, stylists, time_slots, days, seed):
+        self.rng = random.Random(seed)
+        self.services = [
+            (category["category"], item) for category in services for item in category["items"]
+        ]
+        self.stylist_ids = [stylist["id"] for stylist in stylists]
+        self.time_slots = time_slots
+        start = datetime.now().date() + timedelta(days=1)
+        self.dates = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+        self.operations = [
+            ("GET /api/services", 15, self.get_services),
+            ("GET /api/stylists", 10, self.get_stylists),
+            ("GET /api/timeslots", 40, self.get_timeslots),
+            ("POST /api/bookings", 15, self.create_booking),
+            ("GET /api/bookings", 10, self.list_bookings),
+            ("POST /api/contact", 10, self.create_contact),
+        ]
+        self.weights = [weight for _, weight, _ in self.operations]
+
+    def pick(self):
+        return self.rng.choices(self.operations, weights=self.weights)[0]
+
+    async def get_services(self, client):
+        return await client.get("/api/services")
+
+    async def get_stylists(self, client):
+        return await client.get("/api/stylists")
+
+    async def get_timeslots(self, client):
+        category, service = self.rng.choice(self.services)
+        return await client.get("/api/timeslots", params={
+            "date": self.rng.choice(self.dates),
+            "stylist_id": self.rng.choice(self.stylist_ids),
+            "duration": service["duration"],
+        })
+
+    async def create_booking(self, client):
+        category, service = self.rng.choice(self.services)
+        n = self.rng.randrange(1_000_000)
+        return await client.post("/api/bookings", json={
+            "service_category": category,
+            "service_name": service["name"],
+            "service_price": service["price"],
+            "service_duration": service["duration"],
+            "date": self.rng.choice(self.dates),
+            "time": self.rng.choice(self.time_slots),
+            "stylist_id": self.rng.choice(self.stylist_ids),
+            "stylist_name": "Benchmark",
+            "client": {
+                "first_name": "Bench",
+                "last_name": f"Client{n}",
+                "email": f"bench{n}@example.com",
+                "phone": f"+1 555-{n:07d}",
+                "notes": "Benchmark booking",
+            },
+        })
+
+    async def list_bookings(self, client):
+        return await client.get("/api/bookings", params={"limit": 50})
+
+    async def create_contact(self, client):
+        n = self.rng.randrange(1_000_000)
+        return await client.post("/api/contact", json={
+            "first_name": "Bench",
+            "last_name": f"Contact{n}",
+            "email": f"contact{n}@example.com",
+            "subject": "Benchmark",
+            "message": "Benchmark contact submission",
+        })
+
+
+# ==================== Load Runner ====================
+
+async def drive(client, traffic, total, concurrency):
+    """Run `total` requests from `concurrency` workers; returns (samples, errors, elapsed)"""
+    samples = {name: [] for name, _, _ in traffic.operations}
+    errors = {name: 0 for name, _, _ in traffic.operations}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            name, _, operation = traffic.pick()
+            started = time.perf_counter()
+            try:
+                response = await operation(client)
+                failed = response.status_code >= 500
+            except httpx.HTTPError:
+                failed = True
+            samples[name].append(time.perf_counter() - started)
+            if failed:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - started
+
+
+def summarize(samples, errors, elapsed, config):
+    routes = {}
+    for name, latencies in samples.items():
+        latencies.sort()
+        routes[name] = {
+            "count": len(latencies),
+            "errors": errors[name],
+            "rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    total = sum(route["count"] for route in routes.values())
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "config": config,
+        "overall": {"requests": total, "elapsed_s": elapsed, "rps": total / elapsed},
+        "routes": routes,
+    }
+
+
+def print_report(results, baseline=None):
+    print(f"{'Route':<22}{'count':>8}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print("-" * 78)
+    for name, route in results["routes"].items():
+        line = (f"{name:<22}{route['count']:>8}{route['errors']:>8}{route['rps']:>10.1f}"
+                f"{route['p50_ms']:>10.2f}{route['p95_ms']:>10.2f}{route['p99_ms']:>10.2f}")
+        if baseline and name in baseline["routes"] and baseline["routes"][name]["p95_ms"]:
+            change = route["p95_ms"] / baseline["routes"][name]["p95_ms"] - 1
+            line += f"   p95 {change:+.0%}"
+        print(line)
+    print("-" * 78)
+    overall = results["overall"]
+    line = f"Total {overall['requests']} requests in {overall['elapsed_s']:.2f}s = {overall['rps']:.1f} req/s"
+    if baseline:
+        line += f" ({overall['rps'] / baseline['overall']['rps'] - 1:+.0%} vs baseline)"
+    print(line)
+
+
+def regressions(results, baseline, threshold):
+    """Routes whose p95 grew, or overall throughput fell, by more than `threshold`"""
+    found = []
+    for name, route in results["routes"].items():
+        previous = baseline["routes"].get(name)
+        if previous and previous["p95_ms"] and route["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            found.append(f"{name} p95 {previous['p95_ms']:.2f}ms -> {route['p95_ms']:.2f}ms")
+    if results["overall"]["rps"] < baseline["overall"]["rps"] * (1 - threshold):
+        found.append(f"throughput {baseline['overall']['rps']:.1f} -> {results['overall']['rps']:.1f} req/s")
+    return found
+
+
+async def load_traffic(client, days, seed):
+    """A Traffic mix built from the catalog the target server is serving"""
+    services = (await client.get("/api/services")).json()["services"]
+    stylists = (await client.get("/api/stylists")).json()["stylists"]
+    time_slots = (await client.get("/api/timeslots", params={"date": "2000-01-01"})).json()["available_slots"]
+    return Traffic(services, stylists, time_slots, days, seed)
+
+
+async def run_load(args):
+    config = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "days": args.days,
+        "target": args.url or ("mongomock" if args.mongomock else "in-process"),
+    }
+    server = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30)
+    else:
+        server = load_server(args.db_name, args.mongomock)
+        if args.fresh:
+            await server.client.drop_database(args.db_name)
+        await server.app.router.startup()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app), base_url="http://benchmark", timeout=30
+        )
+
+    try:
+        traffic = await load_traffic(client, args.days, args.seed)
+
+        print(f"Benchmarking Luna Hair Salon API ({config['target']})")
+        print(f"{args.requests} requests, concurrency {args.concurrency}, {args.days} days of dates")
+        print("=" * 78)
+        if args.warmup:
+            await drive(client, traffic, args.warmup, args.concurrency)
+        samples, errors, elapsed = await drive(client, traffic, args.requests, args.concurrency)
+    finally:
+        await client.aclose()
+        if server:
+            await server.app.router.shutdown()
+
+    return summarize(samples, errors, elapsed, config)
+
+
+def load_command(args):
+    results = asyncio.run(run_load(args))
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_report(results, baseline)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+        print(f"\n💾 Saved results to {args.save}")
+
+    if baseline:
+        found = regressions(results, baseline, args.threshold)
+        if found:
+            print(f"\n⚠️  Regressions beyond {args.threshold:.0%}:")
+            for regression in found:
+                print(f"  - {regression}")
+            return False
+        print(f"\n🎉 No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return True
+
+
+# ==================== Worker Scaling ====================
+
+def start_server(workers, port, db_name, timeout=60):
+    """Launch backend/serve.py with `workers` workers; returns the process once it answers"""
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "HOST": "127.0.0.1", "PORT": str(port), "DB_NAME": db_name}
+    env.setdefault("RATE_LIMIT_ENABLED", "0")
+    process = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR / "serve.py")],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"serve.py did not answer within {timeout}s")
+
+
+def client_process(url, requests, concurrency, days, seed):
+    """Load generator run in its own process so the client is not the bottleneck"""
+    async def run():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+            traffic = await load_traffic(client, days, seed)
+            return await drive(client, traffic, requests, concurrency)
+
+    samples, errors, elapsed = asyncio.run(run())
+    return [latency for latencies in samples.values() for latency in latencies], sum(errors.values()), elapsed
+
+
+def run_clients(pool, url, args, total):
+    """Spread `total` requests over the client processes; returns (sorted latencies, errors, elapsed)"""
+    per_client = -(-total // args.clients)
+    futures = [
+        pool.submit(client_process, url, per_client, args.concurrency, args.days, args.seed + i)
+        for i in range(args.clients)
+    ]
+    latencies, errors, elapsed = [], 0, 0.0
+    for future in futures:
+        client_latencies, client_errors, client_elapsed = future.result()
+        latencies.extend(client_latencies)
+        errors += client_errors
+        elapsed = max(elapsed, client_elapsed)
+    latencies.sort()
+    return latencies, errors, elapsed
+
+
+def scaling_command(args):
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    print(f"Scaling Luna Hair Salon API across {worker_counts} workers on {os.cpu_count()} CPUs")
+    print(f"{args.requests} requests per run from {args.clients} client processes x {args.concurrency} connections")
+    print(f"{'workers':>8}{'rps':>10}{'speedup':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    print("-" * 66)
+
+    runs = []
+    with ProcessPoolExecutor(args.clients) as pool:
+        for workers in worker_counts:
+            process = start_server(workers, args.port, args.db_name)
+            url = f"http://127.0.0.1:{args.port}"
+            try:
+                if args.warmup:
+                    run_clients(pool, url, args, args.warmup)
+                latencies, errors, elapsed = run_clients(pool, url, args, args.requests)
+            finally:
+                process.terminate()
+                process.wait()
+            run = {
+                "workers": workers,
+                "rps": len(latencies) / elapsed,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "errors": errors,
+            }
+            runs.append(run)
+            print(f"{workers:>8}{run['rps']:>10.1f}{run['rps'] / runs[0]['rps']:>9.2f}x"
+                  f"{run['p50_ms']:>10.2f}{run['p95_ms']:>10.2f}{run['p99_ms']:>10.2f}{errors:>8}")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({"timestamp": datetime.now().isoformat(), "runs": runs}, indent=2))
+        print(f"\n💾 Saved results to {args.save}")
+    return all(run["errors"] == 0 for run in runs)
+
+
+# ==================== Micro-benchmarks ====================
+
+def timed(function, repeat):
+    """Best-of-`repeat` wall time of function() in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def sample_bookings(server, count):
+    """Booking documents shaped like the ones Motor returns"""
+    from bson import ObjectId
+
+    rng = random.Random(7)
+    items = list(server.catalog.snapshot.service_index.values())
+    bookings = []
+    for i in range(count):
+        service = rng.choice(items)
+        bookings.append({
+            "_id": ObjectId(),
+            "id": f"00000000-0000-4000-8000-{i:012d}",
+            "reference": server.encode_reference(i),
+            "status": "confirmed",
+            "service_category": service["category"],
+            "service_name": service["name"],
+            "service_price": service["price"],
+            "service_duration": service["duration"],
+            "services": None,
+            "total_duration": None,
+            "total_price_min": None,
+            "date": "2025-01-25",
+            "time": rng.choice(server.TIME_SLOTS),
+            "stylist_id": rng.randint(1, 3),
+            "stylist_name": "Sofia Martinez",
+            "client_first_name": "Test",
+            "client_last_name": f"Client{i}",
+            "client_email": f"client{i}@example.com",
+            "client_phone": "+1 555-000-0000",
+            "client_notes": "Prefers morning appointments",
+            "created_at": datetime.utcnow(),
+        })
+    return bookings
+
+
+def serialization_command(args):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    server = load_server(args.db_name)
+    if server.orjson is None:
+        print("❌ orjson is not installed; the fast JSON path is unavailable")
+        return False
+    bookings = sample_bookings(server, args.bookings)
+
+    def stdlib_path():
+        # Per-document conversion, then FastAPI's encoder and stdlib json
+        documents = server.prepare_documents([dict(doc) for doc in bookings])
+        return JSONResponse(jsonable_encoder({"bookings": documents, "next_cursor": None})).body
+
+    def orjson_path():
+        return server.FastJSONResponse({"bookings": [dict(doc) for doc in bookings], "next_cursor": None}).body
+
+    assert json.loads(stdlib_path()) == json.loads(orjson_path())
+    per_thousand = 1000 / args.bookings
+    stdlib = timed(stdlib_path, args.repeat) * per_thousand
+    fast = timed(orjson_path, args.repeat) * per_thousand
+
+    print(f"Serializing {args.bookings} bookings (best of {args.repeat}), cost per 1,000 bookings:")
+    print(f"  stdlib json + conversion loop: {stdlib * 1000:8.2f} ms")
+    print(f"  orjson (FAST_JSON):            {fast * 1000:8.2f} ms  ({stdlib / fast:.1f}x faster)")
+    return True
+
+
+def pricing_command(args):
+    server = load_server(args.db_name)
+    snapshot = server.catalog.snapshot
+    items = list(snapshot.service_index.values())
+    rng = random.Random(7)
+    client = {"first_name": "Bench", "last_name": "Client", "email": "bench@example.com", "phone": "+1 555-000-0000"}
+    calls = 1000
+
+    print(f"Server-side pricing per booking (best of {args.repeat}, {calls} bookings each):")
+    for count in [int(n) for n in args.services.split(",")]:
+        chosen = [rng.choice(items) for _ in range(count)]
+        booking_data = server.BookingCreate(
+            services=[{"category": item["category"], "name": item["name"]} for item in chosen],
+            date="2025-01-25",
+            time=server.TIME_SLOTS[0],
+            stylist_id=1,
+            stylist_name="Benchmark",
+            client=client,
+        )
+
+        def quote():
+            for _ in range(calls):
+                snapshot.quote(booking_data.services)
+
+        def reparse():
+            # Without the precomputed table: resolve and parse every price string per request
+            for _ in range(calls):
+                for service in booking_data.services:
+                    entry = snapshot.resolve_service(service.category, service.name)
+                    server.min_price(entry["price"])
+
+        def build():
+            for _ in range(calls):
+                server.build_booking(booking_data, "LUNA-BENCH", snapshot)
+
+        booking = server.build_booking(booking_data, "LUNA-BENCH", snapshot)
+        assert booking.total_duration == sum(item["duration"] for item in chosen)
+        per_call = 1_000_000 / calls
+        print(f"  {count} service(s), {booking.total_duration} min, {booking.total_price_min}:")
+        print(f"    quote (precomputed prices):  {timed(quote, args.repeat) * per_call:7.2f} µs")
+        print(f"    quote (parsing each price):  {timed(reparse, args.repeat) * per_call:7.2f} µs")
+        print(f"    build_booking (full model):  {timed(build, args.repeat) * per_call:7.2f} µs")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("load", help="mixed-traffic load test with per-route percentiles")
+    load.add_argument("--url", help="benchmark a running server instead of importing backend/server.py")
+    load.add_argument("--mongomock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    load.add_argument("--db-name", default="luna_benchmark")
+    load.add_argument("--fresh", action="store_true", help="drop the benchmark database first")
+    load.add_argument("--requests", type=int, default=2000)
+    load.add_argument("--concurrency", type=int, default=50)
+    load.add_argument("--warmup", type=int, default=100)
+    load.add_argument("--days", type=int, default=60, help="spread of booking/timeslot dates")
+    load.add_argument("--seed", type=int, default=42)
+    load.add_argument("--save", help="write results JSON (e.g. a new baseline)")
+    load.add_argument("--baseline", help="compare against a saved results JSON")
+    load.add_argument("--threshold", type=float, default=0.2, help="allowed regression, e.g. 0.2 = 20%%")
+    load.set_defaults(handler=load_command)
+
+    scaling = commands.add_parser("scaling", help="throughput of backend/serve.py as the worker count grows")
+    scaling.add_argument("--workers", default="1,2,4", help="comma-separated worker counts to compare")
+    scaling.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                         help="load generator processes")
+    scaling.add_argument("--port", type=int, default=8011)
+    scaling.add_argument("--db-name", default="luna_benchmark")
+    scaling.add_argument("--requests", type=int, default=5000)
+    scaling.add_argument("--concurrency", type=int, default=50, help="connections per client process")
+    scaling.add_argument("--warmup", type=int, default=500)
+    scaling.add_argument("--days", type=int, default=60, help="spread of booking/timeslot dates")
+    scaling.add_argument("--seed", type=int, default=42)
+    scaling.add_argument("--save", help="write results JSON")
+    scaling.set_defaults(handler=scaling_command)
+
+    serialization = commands.add_parser("serialization", help="JSON cost of the booking listing per 1,000 bookings")
+    serialization.add_argument("--bookings", type=int, default=1000)
+    serialization.add_argument("--repeat", type=int, default=20)
+    serialization.add_argument("--db-name", default="luna_benchmark")
+    serialization.set_defaults(handler=serialization_command)
+
+    pricing = commands.add_parser("pricing", help="cost of validating and pricing a booking's services")
+    pricing.add_argument("--services", default="1,3,5", help="comma-separated services per booking")
+    pricing.add_argument("--repeat", type=int, default=20)
+    pricing.add_argument("--db-name", default="luna_benchmark")
+    pricing.set_defaults(handler=pricing_command)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -2,12 +2,18 @@
 """
 Luna Hair Salon Backend API Test Suite
 Tests all backend endpoints for functionality and data integrity
+
+The concurrency test sends hundreds of bookings from this one address, so
+run the server under test with RATE_LIMIT_ENABLED=0 (or limits raised well
+above 200 requests); rate limiting is covered by tests/test_rate_limit.py.
 """
 
 import requests
 import json
 import sys
-from datetime import datetime
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import os
 
 # Get backend URL from frontend .env file
@@ -25,6 +31,10 @@ def get_backend_url():
 BASE_URL = get_backend_url()
 API_URL = f"{BASE_URL}/api"
 
+# Bookings now reserve their slots, so each run books a fresh future date
+def random_booking_date():
+    return (datetime.now() + timedelta(days=random.randint(365, 3650))).strftime("%Y-%m-%d")
+
 print(f"Testing Luna Hair Salon API at: {API_URL}")
 print("=" * 60)
 
@@ -154,7 +164,7 @@ def test_create_booking():
         "service_name": "Balayage",
         "service_price": "$240+",
         "service_duration": 150,
-        "date": "2025-01-26",
+        "date": random_booking_date(),
         "time": "2:00 PM",
         "stylist_id": 2,
         "stylist_name": "Emma Chen",
@@ -190,6 +200,51 @@ def test_create_booking():
         log_test("Create Booking", False, f"Request error: {str(e)}")
     return False, None
 
+def test_concurrent_booking_same_slot(attempts=200):
+    """Test POST /api/bookings - Concurrent requests for one slot, exactly one may succeed"""
+    booking_date = random_booking_date()
+
+    def post_booking(i):
+        # Distinct clients, so identical-payload suppression does not answer the repeats
+        booking_data = {
+            "service_category": "Haircuts & Styling",
+            "service_name": "HairCut",
+            "service_price": "$50+",
+            "service_duration": 45,
+            "date": booking_date,
+            "time": "11:00 AM",
+            "stylist_id": 1,
+            "stylist_name": "Sofia Martinez",
+            "client": {
+                "first_name": "Race",
+                "last_name": f"Test{i}",
+                "email": f"race{i}@example.com",
+                "phone": "+1 555-999-7777",
+                "notes": "Automated concurrency test"
+            }
+        }
+        try:
+            return requests.post(f"{API_URL}/bookings", json=booking_data, timeout=30).status_code
+        except Exception as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        statuses = list(pool.map(post_booking, range(attempts)))
+
+    created = statuses.count(201)
+    conflicts = statuses.count(409)
+    if created == 1 and conflicts == attempts - 1:
+        log_test("Concurrent Booking Same Slot", True, f"1 created, {conflicts} rejected with 409")
+        return True
+    if 429 in statuses:
+        log_test("Concurrent Booking Same Slot", False,
+                 f"{statuses.count(429)} rate limited; run the server with RATE_LIMIT_ENABLED=0")
+        return False
+    log_test("Concurrent Booking Same Slot", False,
+             f"{created} created, {conflicts} conflicts, "
+             f"other: {[s for s in statuses if s not in (201, 409)][:5]}")
+    return False
+
 def test_get_bookings():
     """Test GET /api/bookings - Should return list of bookings"""
     try:
@@ -262,6 +317,125 @@ def test_get_contacts():
         log_test("Get Contacts", False, f"Request error: {str(e)}")
     return False, None
 
+def test_get_client_bookings(booking_ref=None):
+    """Test GET /api/clients/{email}/bookings - Should list the test client's recent bookings"""
+    try:
+        response = requests.get(f"{API_URL}/clients/TEST@example.com/bookings", timeout=10)
+        
+        if response.status_code == 200:
+            data = response.json()
+            references = [booking["reference"] for booking in data.get("bookings", [])]
+            
+            if booking_ref is None or booking_ref in references:
+                log_test("Get Client Bookings", True, f"{data['client']['bookings']} bookings on record")
+                return True, data
+            else:
+                log_test("Get Client Bookings", False, f"{booking_ref} missing from recent bookings", data)
+        else:
+            log_test("Get Client Bookings", False, f"HTTP {response.status_code}", response.text)
+    except Exception as e:
+        log_test("Get Client Bookings", False, f"Request error: {str(e)}")
+    return False, None
+
+def test_booking_series():
+    """Test POST /api/bookings/series - Book a recurring appointment, then cancel the series"""
+    series_data = {
+        "service_category": "Color Services",
+        "service_name": "Root Touch-up",
+        "start_date": random_booking_date(),
+        "interval_weeks": 6,
+        "count": 3,
+        "time": "11:00 AM",
+        "stylist_id": 3,
+        "stylist_name": "Olivia Brown",
+        "client": {
+            "first_name": "Test",
+            "last_name": "Regular",
+            "email": "regular@example.com",
+            "phone": "+1 555-999-6666"
+        }
+    }
+    
+    try:
+        response = requests.post(f"{API_URL}/bookings/series", json=series_data, timeout=10)
+        
+        if response.status_code == 201:
+            data = response.json()
+            bookings = data.get("bookings", [])
+            
+            if len(bookings) == 3 and all(booking.get("series_id") == data["series_id"] for booking in bookings):
+                cancel = requests.post(f"{API_URL}/bookings/series/{data['series_id']}/cancel", timeout=10)
+                if cancel.status_code == 200 and len(cancel.json().get("cancelled", [])) == 3:
+                    log_test("Booking Series", True, f"Booked and cancelled series {data['series_id']}")
+                    return True, data["series_id"]
+                log_test("Booking Series", False, f"Cancel returned HTTP {cancel.status_code}", cancel.text)
+            else:
+                log_test("Booking Series", False, "Series occurrences missing or unlinked", data)
+        else:
+            log_test("Booking Series", False, f"HTTP {response.status_code}", response.text)
+    except Exception as e:
+        log_test("Booking Series", False, f"Request error: {str(e)}")
+    return False, None
+
+def test_waitlist_join_and_leave():
+    """Test POST /api/waitlist and /api/waitlist/{id}/cancel - Join, then leave the waitlist"""
+    entry_data = {
+        "service_category": "Haircuts & Styling",
+        "service_name": "HairCut",
+        "date": random_booking_date(),
+        "earliest_time": "9:00 AM",
+        "latest_time": "12:00 PM",
+        "stylist_id": 1,
+        "client": {
+            "first_name": "Test",
+            "last_name": "Waitlist",
+            "email": "waitlist@example.com",
+            "phone": "+1 555-999-7777"
+        }
+    }
+    
+    try:
+        response = requests.post(f"{API_URL}/waitlist", json=entry_data, timeout=10)
+        
+        if response.status_code == 201:
+            entry = response.json()
+            # An open window is offered straight away
+            if entry.get("status") in ("waiting", "offered"):
+                leave = requests.post(f"{API_URL}/waitlist/{entry['id']}/cancel", timeout=10)
+                if leave.status_code == 200 and leave.json().get("status") == "cancelled":
+                    log_test("Waitlist Join/Leave", True, f"Joined as {entry['status']}, then left")
+                    return True, entry["id"]
+                log_test("Waitlist Join/Leave", False, f"Leave returned HTTP {leave.status_code}", leave.text)
+            else:
+                log_test("Waitlist Join/Leave", False, f"Unexpected status {entry.get('status')}", entry)
+        else:
+            log_test("Waitlist Join/Leave", False, f"HTTP {response.status_code}", response.text)
+    except Exception as e:
+        log_test("Waitlist Join/Leave", False, f"Request error: {str(e)}")
+    return False, None
+
+def test_get_stats():
+    """Test GET /api/stats - Should return dashboard totals for a date range"""
+    try:
+        today = datetime.now().date()
+        params = {"date_from": today.isoformat(), "date_to": (today + timedelta(days=30)).isoformat()}
+        response = requests.get(f"{API_URL}/stats", params=params, timeout=10)
+        
+        if response.status_code == 200:
+            data = response.json()
+            totals = data.get("totals", {})
+            
+            if all(key in totals for key in ["bookings", "minutes", "revenue_min", "utilization"]):
+                log_test("Get Stats", True, f"{totals['bookings']} bookings, ${totals['revenue_min']:.0f}+ booked")
+                return True, data
+            else:
+                log_test("Get Stats", False, "Missing totals fields", data)
+        else:
+            log_test("Get Stats", False, f"HTTP {response.status_code}", response.text)
+    except Exception as e:
+        log_test("Get Stats", False, f"Request error: {str(e)}")
+    return False, None
+
 def run_all_tests():
     """Run all backend API tests"""
     print("Starting Luna Hair Salon Backend API Tests")
@@ -287,13 +461,28 @@ def run_all_tests():
     # Test 5: Create Booking
     booking_ok, booking_ref = test_create_booking()
     
-    # Test 6: Get Bookings
+    # Test 6: Booking Series
+    series_ok, series_id = test_booking_series()
+    
+    # Test 7: Concurrent Booking Same Slot (after the other bookings, as it floods their rate limit scope)
+    race_ok = test_concurrent_booking_same_slot()
+    
+    # Test 8: Get Bookings
     get_bookings_ok, bookings = test_get_bookings()
     
-    # Test 7: Create Contact
+    # Test 9: Get Client Bookings
+    client_ok, client_history = test_get_client_bookings(booking_ref)
+    
+    # Test 10: Waitlist Join/Leave
+    waitlist_ok, waitlist_id = test_waitlist_join_and_leave()
+    
+    # Test 11: Get Stats
+    stats_ok, stats = test_get_stats()
+    
+    # Test 12: Create Contact
     contact_ok, contact_id = test_create_contact()
     
-    # Test 8: Get Contacts
+    # Test 13: Get Contacts
     get_contacts_ok, contacts = test_get_contacts()
     
     # Summary
@@ -37,8 +37,7 @@ export const services = [
       { name: "BlowDry", price: "$50+", duration: 30 },
       { name: "Wash Cut & BlowDry", price: "$70+", duration: 60 },
       { name: "Up Do", price: "$150+", duration: 90 },
-      { name: "Half Up Do/Prom", price: "$75+", duration: 60 },
-      { name: "Perm", price: "$150", duration: 120 }
+      { name: "Half Up Do/Prom", price: "$75+", duration: 60 }
     ]
   },
   {
@@ -64,7 +63,7 @@ export const services = [
     items: [
       { name: "Hair Keratin", price: "$350+", duration: 180 },
       { name: "Deep Treatment", price: "$55+", duration: 45 },
-      { name: "Hair Extension", price: "Price upon consultation", duration: 180 }
+      { name: "Perm", price: "$150", duration: 120 }
     ]
   },
   {
@@ -77,6 +76,7 @@ export const services = [
       { name: "Eyebrow Shaping", price: "$20+", duration: 15 },
       { name: "Eyelash Extensions", price: "$100+", duration: 90 },
       { name: "Full Face Threading", price: "$50+", duration: 30 },
+      { name: "Hair Extension", price: "Price upon consultation", duration: 180 },
       { name: "Free Consultation", price: "Free", duration: 30 }
     ]
   }
@@ -1,4 +1,4 @@
-import React, { useState, useMemo } from 'react';
+import React, { useState, useMemo, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { format, addDays, startOfWeek, isSameDay, isBefore } from 'date-fns';
 import axios from 'axios';
@@ -20,13 +20,14 @@ import {
 import { Input } from '../components/ui/input';
 import { Textarea } from '../components/ui/textarea';
 import { Button } from '../components/ui/button';
-import { services, timeSlots, stylists, salonInfo } from '../data/mock';
+import { timeSlots, stylists, salonInfo } from '../data/mock';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
 const BookingPage = () => {
   const [step, setStep] = useState(1);
+  const [services, setServices] = useState([]);
   const [selectedServices, setSelectedServices] = useState([]);
   const [expandedCategory, setExpandedCategory] = useState(null);
   const [selectedDate, setSelectedDate] = useState(null);
@@ -44,6 +45,13 @@ const BookingPage = () => {
   const [bookingConfirmed, setBookingConfirmed] = useState(false);
   const [bookingReference, setBookingReference] = useState('');
 
+  // Bookings are checked against the server's catalog, so offer exactly what it lists
+  useEffect(() => {
+    axios.get(`${API}/services`)
+      .then((response) => setServices(response.data.services))
+      .catch((error) => console.error('Error loading services:', error));
+  }, []);
+
   const totals = useMemo(() => {
     let totalDuration = 0;
     let minPrice = 0;
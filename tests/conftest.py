@@ -0,0 +1,51 @@
+"""
+Runs backend/server.py in-process against mongomock-motor, so these tests
+need no MongoDB. Each test should use its own booking dates: the in-memory
+database and availability cache are shared by the whole session.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "luna_test")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import motor.motor_asyncio
+from mongomock_motor import AsyncMongoMockClient
+
+motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import server as server_module
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def server():
+    return server_module
+
+
+@pytest.fixture(scope="session")
+def client(server):
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+def client_info(email):
+    return {"first_name": "Test", "last_name": "Client", "email": email, "phone": "+1 555-000-0000"}
+
+
+def booking_body(date, time, stylist_id=1, email="client@example.com"):
+    return {
+        "service_category": "Color Services",
+        "service_name": "Full Color",
+        "date": date,
+        "time": time,
+        "stylist_id": stylist_id,
+        "stylist_name": "Test",
+        "client": client_info(email),
+    }
@@ -0,0 +1,33 @@
+import asyncio
+
+
+def test_stop_drains_queued_writes(server, client):
+    collection = server.db.batch_writer_drain_test
+    # Nothing would flush on its own before the test gives up
+    writer = server.BatchWriter(collection, batch_size=100, flush_interval=60.0)
+
+    async def queue_and_stop():
+        writer.start()
+        for i in range(250):
+            await writer.put({"_id": i})
+        await asyncio.wait_for(writer.stop(), 5)
+
+    client.portal.call(queue_and_stop)
+    assert not writer.running
+    assert client.portal.call(collection.count_documents, {}) == 250
+
+
+def test_stop_flushes_a_partial_batch_without_waiting(server, client):
+    collection = server.db.batch_writer_partial_test
+    writer = server.BatchWriter(collection, batch_size=100, flush_interval=60.0)
+
+    async def queue_and_stop():
+        writer.start()
+        for i in range(3):
+            await writer.put({"_id": i})
+        # Let the writer start waiting on the flush interval
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(writer.stop(), 5)
+
+    client.portal.call(queue_and_stop)
+    assert client.portal.call(collection.count_documents, {}) == 3
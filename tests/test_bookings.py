@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+
+from tests.conftest import booking_body
+
+
+def test_concurrent_bookings_for_one_slot(server, client, attempts=200):
+    date = "2031-05-06"
+
+    async def race():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            responses = await asyncio.gather(*(
+                http.post("/api/bookings", json=booking_body(date, "11:00 AM", email=f"race{i}@example.com"))
+                for i in range(attempts)
+            ))
+        return [response.status_code for response in responses]
+
+    statuses = client.portal.call(race)
+    assert statuses.count(201) == 1
+    assert statuses.count(409) == attempts - 1
+    claims = client.portal.call(server.db.slot_claims.count_documents, {"date": date, "stylist_id": 1})
+    assert claims == server.slots_needed(90)
+
+
+def test_totals_come_from_the_catalog(server, client):
+    date = "2031-05-07"
+    body = booking_body(date, "10:00 AM")
+    body["services"] = [
+        {"category": "Color Services", "name": "Full Color", "price": "$1", "duration": 5},
+        {"category": "Color Services", "name": "Toner", "price": "$1", "duration": 5},
+    ]
+    body["total_duration"] = 10
+    body["total_price_min"] = "$2+"
+    response = client.post("/api/bookings", json=body)
+    assert response.status_code == 201
+
+    stored = client.portal.call(server.db.bookings.find_one, {"id": response.json()["id"]})
+    assert stored["total_duration"] == 120
+    assert stored["total_price_min"] == "$190+"
+    assert [(service["price"], service["duration"]) for service in stored["services"]] == [("$125+", 90), ("$65+", 30)]
+    # The full catalog duration is blocked, not the 10 minutes sent
+    assert client.post("/api/bookings", json=booking_body(date, "11:30 AM")).status_code == 409
+
+
+def test_stale_cached_occupancy_is_reloaded(server, client):
+    date = "2031-05-08"
+    booking = client.post("/api/bookings", json=booking_body(date, "3:00 PM")).json()
+
+    async def cancel_elsewhere():
+        # What another worker's cancellation leaves behind: Mongo is updated, this cache is not
+        await server.db.bookings.update_one({"id": booking["id"]}, {"$set": {"status": "cancelled"}})
+        await server.db.slot_claims.delete_many({"booking_id": booking["id"]})
+
+    client.portal.call(cancel_elsewhere)
+    assert client.portal.call(server.availability.occupied, date, 1) & server.slot_mask("3:00 PM", 90)
+
+    interval = server.availability.min_reload_interval
+    server.availability.min_reload_interval = 0
+    try:
+        response = client.post("/api/bookings", json=booking_body(date, "3:00 PM", email="second@example.com"))
+    finally:
+        server.availability.min_reload_interval = interval
+    assert response.status_code == 201
@@ -0,0 +1,61 @@
+def test_load_waits_for_seeding_to_finish(server, client):
+    database = server.client["luna_catalog_seed_test"]
+    # Another worker has created the meta document but not yet filled the collections
+    client.portal.call(database.catalog_meta.insert_one,
+                       {"_id": server.Catalog.META_ID, "version": 0, "time_slots": server.TIME_SLOTS})
+    client.portal.call(database.stylists.insert_one, dict(server.STYLISTS[0], _id=server.STYLISTS[0]["id"]))
+
+    catalog = server.Catalog(database)
+    client.portal.call(catalog.load)
+    assert catalog.snapshot.version == 0
+    assert len(catalog.snapshot.stylists) == len(server.STYLISTS)
+    assert len(catalog.snapshot.service_index) == sum(len(category["items"]) for category in server.SERVICES)
+
+
+def test_seed_completes_an_unfinished_seed(server, client):
+    database = server.client["luna_catalog_resume_test"]
+    # A seeder that died after creating the meta document
+    client.portal.call(database.catalog_meta.insert_one,
+                       {"_id": server.Catalog.META_ID, "version": 0, "time_slots": server.TIME_SLOTS})
+
+    catalog = server.Catalog(database)
+    client.portal.call(catalog.seed)
+    client.portal.call(catalog.seed)
+    client.portal.call(catalog.load)
+    assert catalog.snapshot.version == 1
+    assert len(catalog.snapshot.stylists) == len(server.STYLISTS)
+    assert len(catalog.snapshot.services) == len(server.SERVICES)
+
+
+def test_seed_backfills_stylist_categories(server, client):
+    database = server.client["luna_catalog_categories_test"]
+    # A catalog seeded before stylists carried their categories
+    client.portal.call(database.catalog_meta.insert_one,
+                       {"_id": server.Catalog.META_ID, "version": 1, "time_slots": server.TIME_SLOTS})
+    for stylist in server.STYLISTS:
+        legacy = {key: value for key, value in stylist.items() if key != "categories"}
+        client.portal.call(database.stylists.insert_one, dict(legacy, _id=stylist["id"]))
+
+    catalog = server.Catalog(database)
+    client.portal.call(catalog.seed)
+    client.portal.call(catalog.load)
+    assert catalog.snapshot.version == 2
+    assert catalog.snapshot.stylist_categories[1] == {"Color Services", "Hair Treatments"}
+    assert catalog.snapshot.stylist_categories[server.ANY_STYLIST_ID] == set()
+
+
+def test_specialty_policy_uses_catalog_categories(server):
+    stylists = [dict(stylist) for stylist in server.STYLISTS]
+    stylists[0]["categories"] = ["Haircuts & Styling"]
+    stylists[1]["categories"] = ["Color Services"]
+    snapshot = server.CatalogSnapshot(5, server.SERVICES, stylists, server.TIME_SLOTS)
+    masks = {stylist["id"]: 0 for stylist in stylists}
+    booking = {"service_category": "Color Services"}
+
+    previous = server.catalog.snapshot
+    server.catalog.snapshot = snapshot
+    try:
+        ranked = server.specialty_policy(snapshot.real_stylists, masks, booking)
+    finally:
+        server.catalog.snapshot = previous
+    assert ranked[0]["id"] == 2
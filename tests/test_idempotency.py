@@ -0,0 +1,21 @@
+from tests.conftest import booking_body
+
+
+def test_replayed_key_returns_the_original_booking(server, client):
+    date = "2031-08-01"
+    headers = {"Idempotency-Key": "replay-original"}
+    first = client.post("/api/bookings", json=booking_body(date, "10:00 AM"), headers=headers)
+    assert first.status_code == 201
+    replay = client.post("/api/bookings", json=booking_body(date, "10:00 AM"), headers=headers)
+    assert replay.status_code == 201
+    assert replay.json()["reference"] == first.json()["reference"]
+    assert client.portal.call(server.db.bookings.count_documents, {"date": date}) == 1
+
+
+def test_reused_key_with_a_different_body_is_rejected(server, client):
+    date = "2031-08-02"
+    headers = {"Idempotency-Key": "replay-different"}
+    assert client.post("/api/bookings", json=booking_body(date, "10:00 AM"), headers=headers).status_code == 201
+    response = client.post("/api/bookings", json=booking_body(date, "2:00 PM"), headers=headers)
+    assert response.status_code == 422
+    assert client.portal.call(server.db.bookings.count_documents, {"date": date}) == 1
@@ -0,0 +1,35 @@
+import pytest
+
+
+def test_no_two_indexes_share_a_key_pattern(server):
+    for collection, indexes in server.INDEXES.items():
+        keys = [tuple(index.document["key"].items()) for index in indexes]
+        assert len(keys) == len(set(keys)), collection
+
+
+def test_ensure_indexes_drops_obsolete_ones(server, client):
+    database = server.client["luna_index_test"]
+
+    async def upgrade():
+        # What earlier versions created
+        await database.bookings.create_index([("date", 1), ("stylist_id", 1), ("time", 1)], name="date_stylist_time")
+        await server.ensure_indexes(database)
+
+    client.portal.call(upgrade)
+    names = client.portal.call(database.bookings.index_information)
+    assert "date_stylist_time" not in names
+    assert {"reference_unique", "active_date_stylist_time"} <= set(names)
+
+
+def test_duplicate_references_fail_loudly(server, client):
+    database = server.client["luna_duplicate_reference_test"]
+    client.portal.call(database.bookings.insert_many, [
+        {"reference": "LUNA-DUP001"}, {"reference": "LUNA-DUP001"}, {"reference": "LUNA-UNIQUE"},
+    ])
+
+    with pytest.raises(RuntimeError, match=r"LUNA-DUP001 \(2x\)"):
+        client.portal.call(server.ensure_indexes, database)
+    names = client.portal.call(database.bookings.index_information)
+    assert "reference_unique" not in names
+    # The other bookings indexes are created regardless
+    assert "active_date_stylist_time" in names
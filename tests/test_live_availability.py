@@ -0,0 +1,70 @@
+from tests.conftest import booking_body, client_info
+
+
+def waitlist_body(date, email):
+    return {
+        "service_category": "Color Services",
+        "service_name": "Toner",
+        "date": date,
+        "earliest_time": "9:00 AM",
+        "latest_time": "9:00 AM",
+        "stylist_id": 1,
+        "client": client_info(email),
+    }
+
+
+def available(client, date):
+    return client.get("/api/timeslots", params={"date": date, "stylist_id": 1, "duration": 30}).json()["available_slots"]
+
+
+def test_held_slots_are_not_listed_until_released(server, client):
+    date = "2031-04-02"
+    changes = []
+    listener = lambda *change: changes.append(change)
+    server.availability.listeners.append(listener)
+    try:
+        entry = client.post("/api/waitlist", json=waitlist_body(date, "held@example.com")).json()
+        assert entry["status"] == "offered"
+        assert "9:00 AM" not in available(client, date)
+        assert client.post("/api/bookings", json=booking_body(date, "9:00 AM")).status_code == 409
+
+        # Still taken after the cache is reloaded from Mongo
+        server.availability.invalidate(date)
+        assert "9:00 AM" not in available(client, date)
+
+        # Declining the offer frees the time and tells live viewers
+        assert client.post(f"/api/waitlist/{entry['id']}/cancel").status_code == 200
+        assert "9:00 AM" in available(client, date)
+        assert (date, 1, server.slot_mask("9:00 AM", 30), False) in changes
+    finally:
+        server.availability.listeners.remove(listener)
+
+
+def test_expired_hold_is_released(server, client):
+    date = "2031-04-03"
+    entry = client.post("/api/waitlist", json=waitlist_body(date, "expiring@example.com")).json()
+    assert "9:00 AM" not in available(client, date)
+
+    async def expire():
+        await server.db.waitlist.update_one({"id": entry["id"]}, {"$set": {"offer.expires_at": server.datetime.utcnow()}})
+        return await server.waitlist.expire_offers()
+
+    assert client.portal.call(expire) == 1
+    assert "9:00 AM" in available(client, date)
+
+
+def test_accepting_a_hold_seen_through_the_change_stream(server, client):
+    date = "2031-04-01"
+    entry = client.post("/api/waitlist", json=waitlist_body(date, "accepted@example.com")).json()
+    holds = client.portal.call(server.db.slot_claims.find({"booking_id": entry["id"]}).to_list, None)
+
+    # What a worker running LIVE_AVAILABILITY_SOURCE=changestream receives for the hold
+    for claim in holds:
+        server.claim_change_stream.apply({"operationType": "insert", "documentKey": {"_id": claim["_id"]},
+                                          "fullDocument": claim})
+    assert client.portal.call(server.availability.occupied, date, 1) & server.slot_mask("9:00 AM", 30)
+
+    # The entry's own hold does not block its acceptance
+    response = client.post(f"/api/waitlist/{entry['id']}/accept")
+    assert response.status_code == 201
+    assert "9:00 AM" not in available(client, date)
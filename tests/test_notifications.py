@@ -0,0 +1,124 @@
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from tests.conftest import booking_body
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def dispatcher_for(server, collection, port, **options):
+    return server.NotificationDispatcher(collection, server.SMTPSender("127.0.0.1", port), **options)
+
+
+def test_booking_confirmation_is_delivered(server, client, smtp):
+    controller, handler = smtp
+    booking = client.post("/api/bookings", json=booking_body("2031-06-03", "10:00 AM", email="mail@example.com")).json()
+    entries = client.portal.call(server.db.outbox.find({"booking_id": booking["id"]}).to_list, None)
+    assert {entry["kind"] for entry in entries} == {"confirmation", "reminder"}
+
+    dispatcher = dispatcher_for(server, server.db.outbox, controller.port)
+    client.portal.call(dispatcher.dispatch_once)
+
+    confirmation = client.portal.call(server.db.outbox.find_one, {"_id": f"{booking['id']}|confirmation"})
+    assert confirmation["status"] == "sent"
+    delivered = [envelope for envelope in handler.messages if booking["reference"].encode() in envelope.content]
+    assert len(delivered) == 1
+    assert delivered[0].rcpt_tos == ["mail@example.com"]
+    # The reminder is not due until the day before the appointment
+    reminder = client.portal.call(server.db.outbox.find_one, {"_id": f"{booking['id']}|reminder"})
+    assert reminder["status"] == "pending"
+
+
+def test_failed_delivery_is_retried_with_backoff(server, client, smtp):
+    controller, handler = smtp
+    outbox = server.db.outbox_retry_test
+    booking = {
+        "id": "retry-booking",
+        "reference": "LUNA-RETRY",
+        "client_first_name": "Retry",
+        "client_last_name": "Client",
+        "client_email": "retry@example.com",
+        "date": "2031-06-04",
+        "time": "10:00 AM",
+        "stylist_name": "Sofia Martinez",
+        "service_name": "HairCut",
+    }
+    entry = server.outbox_entries(booking)[0]
+    client.portal.call(outbox.insert_one, entry)
+
+    # Nothing listens on this port, so the first attempt fails
+    failing = dispatcher_for(server, outbox, free_port(), backoff=60.0, max_attempts=2)
+    started = datetime.utcnow()
+    client.portal.call(failing.dispatch_once)
+    retried = client.portal.call(outbox.find_one, {"_id": entry["_id"]})
+    assert retried["status"] == "pending"
+    assert retried["attempts"] == 1
+    assert retried["next_attempt_at"] >= started + timedelta(seconds=60)
+    # Not due again until the backoff has passed
+    assert client.portal.call(failing.dispatch_once) == 0
+
+    client.portal.call(outbox.update_one, {"_id": entry["_id"]}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+    client.portal.call(dispatcher_for(server, outbox, controller.port).dispatch_once)
+    assert client.portal.call(outbox.find_one, {"_id": entry["_id"]})["status"] == "sent"
+    assert len([envelope for envelope in handler.messages if b"LUNA-RETRY" in envelope.content]) == 1
+
+
+def test_failed_delivery_gives_up_after_max_attempts(server, client):
+    outbox = server.db.outbox_give_up_test
+    entry = {
+        "_id": "give-up|confirmation",
+        "kind": "confirmation",
+        "booking_id": "give-up",
+        "to": "give-up@example.com",
+        "payload": {"reference": "LUNA-GIVEUP", "client_name": "A B", "date": "2031-06-05",
+                    "time": "10:00 AM", "stylist_name": "Sofia Martinez", "services": "HairCut"},
+        "status": "pending",
+        "attempts": 1,
+        "next_attempt_at": datetime.utcnow(),
+        "created_at": datetime.utcnow(),
+    }
+    client.portal.call(outbox.insert_one, entry)
+    client.portal.call(dispatcher_for(server, outbox, free_port(), max_attempts=2).dispatch_once)
+    assert client.portal.call(outbox.find_one, {"_id": entry["_id"]})["status"] == "failed"
+
+
+def test_cancelling_a_booking_cancels_its_reminder(server, client, smtp):
+    controller, handler = smtp
+    booking = client.post("/api/bookings", json=booking_body("2031-06-06", "10:00 AM", email="gone@example.com")).json()
+    assert client.post(f"/api/bookings/{booking['reference']}/cancel").status_code == 200
+
+    reminder_id = f"{booking['id']}|reminder"
+    reminder = client.portal.call(server.db.outbox.find_one, {"_id": reminder_id})
+    assert reminder["status"] == "cancelled"
+
+    # Even once due, a cancelled reminder is never sent
+    client.portal.call(server.db.outbox.update_one, {"_id": reminder_id}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+    client.portal.call(dispatcher_for(server, server.db.outbox, controller.port).dispatch_once)
+    assert client.portal.call(server.db.outbox.find_one, {"_id": reminder_id})["status"] == "cancelled"
+    assert not [envelope for envelope in handler.messages if b"Reminder" in envelope.content
+                and booking["reference"].encode() in envelope.content]
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+
+def request_from(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+def test_client_ip_behind_one_proxy(server, monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_PROXY_HOPS", 1)
+    # The ingress appends the real client; the spoofed entry before it is ignored
+    assert server.client_ip(request_from("10.0.0.5", "1.2.3.4, 203.0.113.7")) == "203.0.113.7"
+    assert server.client_ip(request_from("10.0.0.5")) == "10.0.0.5"
+
+
+def test_client_ip_without_proxies(server, monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_PROXY_HOPS", 0)
+    assert server.client_ip(request_from("198.51.100.2", "1.2.3.4")) == "198.51.100.2"
+
+
+def test_customers_behind_the_ingress_get_separate_buckets(server, monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(server, "RATE_LIMIT_PROXY_HOPS", 1)
+    monkeypatch.setattr(server, "ip_rate_limiter", server.MemoryRateLimiter(per_minute=1, burst=1))
+    monkeypatch.setattr(server, "email_rate_limiter", server.MemoryRateLimiter(per_minute=100, burst=100))
+
+    async def book(forwarded):
+        await server.enforce_rate_limit(request_from("10.0.0.5", forwarded), "someone@example.com", "bookings")
+
+    asyncio.run(book("203.0.113.7"))
+    asyncio.run(book("203.0.113.8"))
+    with pytest.raises(server.HTTPException) as limited:
+        asyncio.run(book("203.0.113.7"))
+    assert limited.value.status_code == 429
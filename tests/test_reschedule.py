@@ -0,0 +1,43 @@
+from tests.conftest import booking_body
+
+
+def book(client, date, time, stylist_id=1, email="client@example.com"):
+    response = client.post("/api/bookings", json=booking_body(date, time, stylist_id=stylist_id, email=email))
+    assert response.status_code == 201
+    return response.json()
+
+
+def reschedule(client, booking, **change):
+    return client.post(f"/api/bookings/{booking['reference']}/reschedule", json=change)
+
+
+def test_reschedule_frees_the_old_time(client):
+    date = "2031-10-07"
+    booking = book(client, date, "9:30 AM")
+    response = reschedule(client, booking, date=date, time="2:00 PM")
+    assert response.status_code == 200
+    assert response.json()["time"] == "2:00 PM"
+    assert "9:30 AM" in client.get("/api/timeslots", params={"date": date, "stylist_id": 1, "duration": 90}).json()["available_slots"]
+    assert client.post("/api/bookings", json=booking_body(date, "2:00 PM", email="late@example.com")).status_code == 409
+
+
+def test_reschedule_onto_a_taken_time_is_rejected(client):
+    date = "2031-10-08"
+    booking = book(client, date, "9:00 AM")
+    book(client, date, "2:00 PM", email="other@example.com")
+    assert reschedule(client, booking, date=date, time="2:30 PM").status_code == 409
+    assert client.get(f"/api/bookings/{booking['reference']}").json()["time"] == "9:00 AM"
+
+
+def test_any_available_reschedule_may_overlap_its_own_time(client):
+    date = "2031-10-09"
+    booking = book(client, date, "9:30 AM")
+    # The other stylists are busy all morning
+    for stylist_id in (2, 3):
+        for time in ("9:00 AM", "10:30 AM", "12:00 PM"):
+            book(client, date, time, stylist_id=stylist_id, email=f"busy{stylist_id}@example.com")
+
+    response = reschedule(client, booking, date=date, time="10:00 AM", stylist_id=4)
+    assert response.status_code == 200
+    assert response.json()["stylist_id"] == 1
+    assert response.json()["time"] == "10:00 AM"
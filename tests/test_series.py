@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+from tests.conftest import booking_body, client_info
+
+
+def series_body(start_date, interval_weeks=1, count=3, time="10:00 AM", stylist_id=2):
+    return {
+        "service_category": "Color Services",
+        "service_name": "Root Touch-up",
+        "start_date": start_date,
+        "interval_weeks": interval_weeks,
+        "count": count,
+        "time": time,
+        "stylist_id": stylist_id,
+        "stylist_name": "Emma Chen",
+        "client": client_info("series@example.com"),
+    }
+
+
+def weeks_from(start_date, weeks):
+    return (date.fromisoformat(start_date) + timedelta(weeks=weeks)).isoformat()
+
+
+def claim_owners(server, client, series):
+    claims = client.portal.call(
+        server.db.slot_claims.find({"booking_id": {"$in": [booking["id"] for booking in series["bookings"]]}}).to_list,
+        None
+    )
+    return {claim["_id"]: claim["booking_id"] for claim in claims}
+
+
+def test_shift_by_the_interval_moves_every_occurrence(server, client):
+    start = "2031-07-01"
+    series = client.post("/api/bookings/series", json=series_body(start)).json()
+    series_id = series["series_id"]
+
+    response = client.post(f"/api/bookings/series/{series_id}/reschedule", json={"shift_days": 7})
+    assert response.status_code == 200
+    dates = [booking["date"] for booking in response.json()["rescheduled"]]
+    assert dates == [weeks_from(start, 1), weeks_from(start, 2), weeks_from(start, 3)]
+
+    stored = client.get(f"/api/bookings/series/{series_id}").json()["bookings"]
+    assert [booking["date"] for booking in stored] == dates
+    owners = claim_owners(server, client, series)
+    span = server.slots_needed(60)
+    assert len(owners) == 3 * span
+    for booking in stored:
+        assert sum(owner == booking["id"] for owner in owners.values()) == span
+        assert all(claim_id.startswith(booking["date"]) for claim_id, owner in owners.items() if owner == booking["id"])
+    # The first week is free again; the new last week is taken
+    assert client.post("/api/bookings", json=booking_body(start, "10:00 AM", stylist_id=2)).status_code == 201
+    assert client.post("/api/bookings", json=booking_body(weeks_from(start, 3), "10:00 AM", stylist_id=2)).status_code == 409
+
+
+def test_a_clash_leaves_the_series_unchanged(server, client):
+    start = "2031-08-05"
+    series = client.post("/api/bookings/series", json=series_body(start)).json()
+    series_id = series["series_id"]
+    before = claim_owners(server, client, series)
+    blocker = booking_body(weeks_from(start, 3), "10:00 AM", stylist_id=2, email="blocker@example.com")
+    assert client.post("/api/bookings", json=blocker).status_code == 201
+
+    response = client.post(f"/api/bookings/series/{series_id}/reschedule", json={"shift_days": 7})
+    assert response.status_code == 409
+    assert response.json()["detail"]["conflicting_dates"] == [weeks_from(start, 3)]
+    stored = client.get(f"/api/bookings/series/{series_id}").json()["bookings"]
+    assert [booking["date"] for booking in stored] == [start, weeks_from(start, 1), weeks_from(start, 2)]
+    assert claim_owners(server, client, series) == before
+
+
+def test_a_clash_found_by_the_claims_leaves_the_series_unchanged(server, client):
+    start = "2031-09-02"
+    series = client.post("/api/bookings/series", json=series_body(start)).json()
+    series_id = series["series_id"]
+    before = claim_owners(server, client, series)
+    # Taken by another worker: this worker's availability cache does not know yet
+    taken = server.claim_id(weeks_from(start, 3), 2, "10:30 AM")
+    client.portal.call(server.db.slot_claims.insert_one, {"_id": taken, "booking_id": "elsewhere"})
+
+    response = client.post(f"/api/bookings/series/{series_id}/reschedule", json={"shift_days": 7})
+    assert response.status_code == 409
+    stored = client.get(f"/api/bookings/series/{series_id}").json()["bookings"]
+    assert [booking["date"] for booking in stored] == [start, weeks_from(start, 1), weeks_from(start, 2)]
+    assert claim_owners(server, client, series) == before
+    assert client.portal.call(server.db.slot_claims.find_one, {"_id": taken})["booking_id"] == "elsewhere"
@@ -0,0 +1,44 @@
+from tests.conftest import booking_body
+
+
+def balayage(date, time, email="balayage@example.com"):
+    body = booking_body(date, time, email=email)
+    body["service_name"] = "Balayage"
+    return body
+
+
+def available(client, date, duration):
+    response = client.get("/api/timeslots", params={"date": date, "stylist_id": 1, "duration": duration})
+    return response.json()["available_slots"]
+
+
+def test_long_service_blocks_every_slot_it_spans(server, client):
+    date = "2031-07-01"
+    assert client.post("/api/bookings", json=balayage(date, "10:00 AM")).status_code == 201
+
+    free = available(client, date, 30)
+    # 150 minutes from 10:00 AM covers five 30-minute slots
+    for time in ["10:00 AM", "10:30 AM", "11:00 AM", "11:30 AM", "12:00 PM"]:
+        assert time not in free
+    assert "9:30 AM" in free and "12:30 PM" in free
+
+
+def test_long_service_drops_start_times_that_run_past_closing(server, client):
+    free = available(client, "2031-07-02", 150)
+    # The last slot starts at 7:00 PM, so 5:00 PM is the latest five-slot start
+    assert free[-1] == "5:00 PM"
+    for time in ["5:30 PM", "6:00 PM", "6:30 PM", "7:00 PM"]:
+        assert time not in free
+
+
+def test_overlapping_start_is_rejected(server, client):
+    date = "2031-07-03"
+    assert client.post("/api/bookings", json=balayage(date, "10:00 AM")).status_code == 201
+    # Starts inside the first booking's span without sharing its start time
+    response = client.post("/api/bookings", json=booking_body(date, "11:30 AM", email="overlap@example.com"))
+    assert response.status_code == 409
+    # A 90-minute service from 9:00 AM would run into it too
+    assert "9:00 AM" not in available(client, date, 90)
+    assert client.post("/api/bookings", json=booking_body(date, "9:00 AM")).status_code == 409
+    # Right after it ends is free
+    assert client.post("/api/bookings", json=booking_body(date, "12:30 PM")).status_code == 201
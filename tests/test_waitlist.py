@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+from tests.conftest import booking_body, client_info
+
+
+def waiting_entry(date, stylist_id=1):
+    return {
+        "id": str(uuid.uuid4()),
+        "status": "waiting",
+        "date": date,
+        "earliest_time": "9:00 AM",
+        "latest_time": "9:00 AM",
+        "stylist_id": stylist_id,
+        "client": client_info("waiting@example.com"),
+        "created_at": datetime.utcnow(),
+        "service_category": "Color Services",
+        "service_name": "Toner",
+        "duration": 30,
+    }
+
+
+def test_concurrent_matchers_hold_an_entry_once(server, client):
+    date = "2031-03-04"
+    entry = waiting_entry(date)
+    client.portal.call(server.db.waitlist.insert_one, dict(entry))
+    matchers = [server.WaitlistMatcher(server.db.waitlist) for _ in range(2)]
+
+    async def race():
+        return await asyncio.gather(*(matcher.match(date, 1) for matcher in matchers))
+
+    assert sorted(client.portal.call(race)) == [0, 1]
+    held = client.portal.call(server.db.waitlist.find_one, {"id": entry["id"]})
+    assert held["status"] == "offered"
+    assert held["offer"]["time"] == "9:00 AM"
+    claims = client.portal.call(server.db.slot_claims.count_documents, {"booking_id": entry["id"]})
+    assert claims == server.slots_needed(entry["duration"])
+    assert client.post("/api/bookings", json=booking_body(date, "9:00 AM")).status_code == 409
+
+
+def test_losing_offer_keeps_the_winners_hold(server, client):
+    date = "2031-03-05"
+    entry = waiting_entry(date)
+    client.portal.call(server.db.waitlist.insert_one, dict(entry))
+    stylist = server.catalog.snapshot.stylist_index[1]
+
+    async def offer_twice():
+        # The second offer works from the same stale "waiting" read
+        first = await server.waitlist.offer(entry, stylist, "9:00 AM")
+        second = await server.waitlist.offer(entry, stylist, "9:00 AM")
+        return first, second
+
+    assert client.portal.call(offer_twice) == (True, False)
+    claims = client.portal.call(server.db.slot_claims.count_documents, {"booking_id": entry["id"]})
+    assert claims == server.slots_needed(entry["duration"])
+    assert client.post("/api/bookings", json=booking_body(date, "9:00 AM")).status_code == 409
+
+
+def test_join_waitlist_returns_201(server, client):
+    body = {
+        "service_category": "Color Services",
+        "service_name": "Toner",
+        "date": "2031-03-06",
+        "earliest_time": "9:00 AM",
+        "latest_time": "11:00 AM",
+        "stylist_id": 1,
+        "client": client_info("joining@example.com"),
+    }
+    response = client.post("/api/waitlist", json=body)
+    assert response.status_code == 201
+    assert response.json()["status"] == "offered"